@@ -1,14 +1,14 @@
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
 from config import settings
+from shared.views import MediaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
     path('users/', include('users.urls')),
     path('posts/', include('post.urls')),
+    path('uploads/', include('shared.urls')),
+    path(settings.MEDIA_URL.lstrip('/') + '<path:name>', MediaView.as_view()),
 ]
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Only serving processes build the refresh token blacklist filter up front;
+# management commands and pool workers never need it.
+from django.conf import settings  # noqa: E402
+
+if settings.REFRESH_BLACKLIST_PRELOAD:
+    from users.tokens import blacklist_filter
+
+    blacklist_filter.start()
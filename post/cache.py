@@ -0,0 +1,119 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from post.models import Post, PostLike, LikeCounterDelta
+from users.models import User
+
+POST_CACHE_TIMEOUT = getattr(settings, 'POST_CACHE_TIMEOUT', 300)
+# Author entries are dropped when the user is saved; a reader that loaded the
+# row just before that commit can put the old one back for at most this long.
+AUTHOR_CACHE_TIMEOUT = getattr(settings, 'POST_AUTHOR_CACHE_TIMEOUT', 60)
+# Fields of User that PostSerializer's author representation shows.
+AUTHOR_FIELDS = ('id', 'username', 'photo', 'user_role')
+
+
+def post_version_key(pk):
+    return f"post-version:{pk}"
+
+
+def post_cache_key(pk, version):
+    return f"post:{pk}:{version}"
+
+
+def author_cache_key(pk):
+    return f"post-author:{pk}"
+
+
+def invalidate_post(*pks):
+    # Gives each post a new version after commit. Readers take the version
+    # before they read the row, so one that loaded the old row stores it under
+    # the old version, where nobody looks any more. Versions outlive the
+    # entries made under them, so an evicted version never brings one back.
+    keys = [post_version_key(pk) for pk in pks]
+    transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex[:12] for key in keys},
+                                                 2 * POST_CACHE_TIMEOUT))
+
+
+def invalidate_author(pk):
+    key = author_cache_key(pk)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def cached_posts(post_ids):
+    # Viewer- and author-independent representations, keyed by post id: one
+    # get_many for the versions, one for the entries, one query for misses.
+    from post.serializers import PostSerializer
+
+    versions = cache.get_many([post_version_key(pk) for pk in post_ids])
+    keys = {post_cache_key(pk, versions.get(post_version_key(pk), 0)): pk for pk in post_ids}
+    found = cache.get_many(list(keys))
+    cached = {keys[key]: data for key, data in found.items()}
+    missing = {pk: key for key, pk in keys.items() if pk not in cached}
+    authors = {}
+    if missing:
+        fresh = {}
+        for post in Post.objects.filter(pk__in=list(missing)).select_related('author'):
+            data = dict(PostSerializer(post).data)
+            authors[str(post.author_id)] = data['author']
+            # The author is kept under its own key and stored by id here.
+            data = {('author_id' if key == 'author' else key): (str(post.author_id) if key == 'author' else value)
+                    for key, value in data.items()}
+            fresh[missing[post.pk]] = data
+            cached[post.pk] = data
+        cache.set_many(fresh, POST_CACHE_TIMEOUT)
+        cache.set_many({author_cache_key(pk): author for pk, author in authors.items()}, AUTHOR_CACHE_TIMEOUT)
+    return cached, authors
+
+
+def cached_authors(author_ids, authors):
+    from post.serializers import UserSerializer
+
+    wanted = [pk for pk in author_ids if pk not in authors]
+    if wanted:
+        keys = {author_cache_key(pk): pk for pk in wanted}
+        authors.update((keys[key], data) for key, data in cache.get_many(list(keys)).items())
+        missing = [pk for pk in wanted if pk not in authors]
+        if missing:
+            fresh = {str(user.pk): dict(UserSerializer(user).data)
+                     for user in User.objects.filter(pk__in=missing).only(*AUTHOR_FIELDS)}
+            cache.set_many({author_cache_key(pk): data for pk, data in fresh.items()}, AUTHOR_CACHE_TIMEOUT)
+            authors.update(fresh)
+    return authors
+
+
+def render_posts(post_ids, request, liked=None):
+    # URLs are cached relative and made absolute for this request; the author,
+    # likes still pending in like_counter_deltas and me_like are merged in last.
+    cached, authors = cached_posts(post_ids)
+    pending = LikeCounterDelta.objects.pending(Post, post_ids) if post_ids else {}
+    authors = cached_authors({data['author_id'] for data in cached.values()}, authors)
+
+    if liked is None:
+        liked = set()
+        if request.user.is_authenticated and post_ids:
+            liked = set(PostLike.objects.filter(author=request.user, post_id__in=post_ids)
+                        .values_list('post_id', flat=True))
+
+    results = []
+    for pk in post_ids:
+        if pk not in cached or cached[pk]['author_id'] not in authors:
+            continue
+        data = {('author' if key == 'author_id' else key): (dict(authors[value]) if key == 'author_id' else value)
+                for key, value in cached[pk].items()}
+        data['image'] = absolute_url(request, data['image'])
+        data['author']['photo'] = absolute_url(request, data['author']['photo'])
+        data['renditions'] = {
+            name: dict(rendition, url=absolute_url(request, rendition['url']))
+            for name, rendition in data['renditions'].items()
+        }
+        data['post_likes_count'] = max(data['post_likes_count'] + pending.get(pk, 0), 0)
+        data['me_like'] = pk in liked
+        results.append(data)
+    return results
+
+
+def absolute_url(request, url):
+    return request.build_absolute_uri(url) if url else url
@@ -0,0 +1,129 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+FLUSH_INTERVAL_MS = getattr(settings, 'LIKE_COUNTER_FLUSH_MS', 200)
+FLUSH_EVENTS = getattr(settings, 'LIKE_COUNTER_FLUSH_EVENTS', 1000)
+FLUSH_BATCH_SIZE = getattr(settings, 'LIKE_COUNTER_FLUSH_BATCH_SIZE', 10000)
+DELTA_TABLE = 'like_counter_deltas'
+# Held by whoever applies deltas to the counters: the flusher of any process
+# and reconcile_counters, so the two never work on the same deltas at once.
+FLUSH_LOCK_ID = 0x6c696b6573
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    # Write-behind for likes_count. A like or unlike does not update the hot
+    # target row; it appends a delta row to like_counter_deltas in its own
+    # transaction (LikeCounterDelta), so pending deltas are durable and shared
+    # by every process. A background thread in each process that recorded
+    # deltas drains the table into the counters every FLUSH_INTERVAL_MS, or
+    # after FLUSH_EVENTS deltas, one UPDATE per model. Counters as shown to
+    # clients are likes_count plus the pending deltas of the target.
+
+    def __init__(self, field='likes_count', interval_ms=FLUSH_INTERVAL_MS, max_events=FLUSH_EVENTS,
+                 batch_size=FLUSH_BATCH_SIZE):
+        self.field = field
+        self.interval = interval_ms / 1000
+        self.max_events = max_events
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.events = 0
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def record(self, model, deltas):
+        # Must run in the transaction that changes the like rows.
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {DELTA_TABLE} (target_type, target_id, delta) "
+                f"SELECT %s, v.id, v.delta FROM unnest(%s::uuid[], %s::int[]) AS v(id, delta)",
+                [model._meta.db_table, list(deltas), list(deltas.values())],
+            )
+        self.notify_on_commit(len(deltas))
+
+    def notify_on_commit(self, events=1):
+        transaction.on_commit(lambda: self.notify(events))
+
+    def notify(self, events=1):
+        with self.lock:
+            self.events += events
+            full = self.events >= self.max_events
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='counter-buffer', daemon=True)
+                self.thread.start()
+        if full:
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            with self.lock:
+                events, self.events = self.events, 0
+            if not events:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Like counter flush failed, retrying next window")
+                with self.lock:
+                    self.events += events
+            finally:
+                # No connection is held between windows.
+                connection.close()
+
+    def flush(self, wait=False):
+        # Drains the whole table, not only this process's deltas. Without
+        # `wait` it gives up if another process is already flushing.
+        from post.models import Post, Comment
+
+        while True:
+            with transaction.atomic():
+                if not self.lock_deltas(wait):
+                    return
+                drained = [self.apply(model) for model in (Post, Comment)]
+            if max(drained) < self.batch_size:
+                return
+
+    @staticmethod
+    def lock_deltas(wait=True):
+        with connection.cursor() as cursor:
+            if wait:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [FLUSH_LOCK_ID])
+                return True
+            cursor.execute("SELECT pg_try_advisory_xact_lock(%s)", [FLUSH_LOCK_ID])
+            return cursor.fetchone()[0]
+
+    def apply(self, model):
+        from post.cache import invalidate_post
+        from post.models import Post
+
+        qn = connection.ops.quote_name
+        table, field = qn(model._meta.db_table), qn(self.field)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH drained AS ("
+                f"DELETE FROM {DELTA_TABLE} WHERE id IN ("
+                f"SELECT id FROM {DELTA_TABLE} WHERE target_type = %s ORDER BY id LIMIT %s"
+                f") RETURNING target_id, delta"
+                f"), summed AS (SELECT target_id, SUM(delta) AS delta FROM drained GROUP BY target_id"
+                f"), updated AS ("
+                f"UPDATE {table} SET {field} = GREATEST({table}.{field} + summed.delta, 0) FROM summed "
+                f"WHERE {table}.id = summed.target_id RETURNING {table}.id"
+                f") SELECT (SELECT count(*) FROM drained), ARRAY(SELECT id FROM updated)",
+                [model._meta.db_table, self.batch_size],
+            )
+            drained, pks = cursor.fetchone()
+        if model is Post and pks:
+            invalidate_post(*pks)
+        return drained
+
+
+like_counters = CounterBuffer()
@@ -0,0 +1,140 @@
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Value
+
+from post.models import Post, Timeline
+from shared.custom_pagination import CustomPagination
+from users.models import User, Follow
+
+FANOUT_BATCH_SIZE = getattr(settings, 'FEED_FANOUT_BATCH_SIZE', 1000)
+FANOUT_THRESHOLD = getattr(settings, 'FEED_FANOUT_THRESHOLD', 10000)
+FOLLOW_BACKFILL_SIZE = getattr(settings, 'FEED_FOLLOW_BACKFILL_SIZE', 50)
+FANOUT_WORKERS = getattr(settings, 'FEED_FANOUT_WORKERS', 2)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_high_fanout(author_id, threshold=None):
+    threshold = FANOUT_THRESHOLD if threshold is None else threshold
+    if User.objects.filter(pk=author_id, high_fanout=True).exists():
+        return True
+    # Counting stops at the threshold, so this stays cheap for huge accounts.
+    if Follow.objects.filter(following_id=author_id).values('pk')[:threshold].count() < threshold:
+        return False
+    User.objects.filter(pk=author_id).update(high_fanout=True)
+    return True
+
+
+def fan_out_post(post, threshold=None):
+    # The author sees their own post too; followers get it in batches so a
+    # large audience never builds one giant INSERT. High-fanout authors are
+    # left to pull at read time.
+    Timeline.objects.bulk_create(
+        [Timeline(user_id=post.author_id, post_id=post.pk, create_time=post.create_time)],
+        ignore_conflicts=True,
+    )
+    if is_high_fanout(post.author_id, threshold):
+        return
+    followers = Follow.objects.filter(following_id=post.author_id).order_by('pk').values_list('follower_id', flat=True)
+    batch = []
+    for follower_id in followers.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(Timeline(user_id=follower_id, post_id=post.pk, create_time=post.create_time))
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        Timeline.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_timeline(user_id, author_id):
+    if User.objects.filter(pk=author_id, high_fanout=True).exists():
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by('-create_time', '-id')[:FOLLOW_BACKFILL_SIZE]
+    Timeline.objects.bulk_create(
+        [Timeline(user_id=user_id, post_id=post_id, create_time=create_time)
+         for post_id, create_time in posts.values_list('pk', 'create_time')],
+        ignore_conflicts=True,
+    )
+
+
+def drop_from_timeline(user_id, author_id):
+    Timeline.objects.filter(user_id=user_id, post__author_id=author_id).delete()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # A fixed number of threads, however many posts are created at once;
+            # the rest wait in the executor's queue.
+            _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fan-out')
+    return _executor
+
+
+def run_fan_out(post):
+    try:
+        fan_out_post(post)
+    except Exception:
+        logger.exception("Fan-out of post %s failed", post.pk)
+    finally:
+        connection.close()
+
+
+def schedule_fan_out(post):
+    get_executor().submit(run_fan_out, post)
+
+
+class FeedPagination(CustomPagination):
+    # Pages the caller's pushed timeline merged with the latest posts of the
+    # high-fanout accounts they follow. Entries are Timeline objects either way;
+    # pulled ones are simply not saved.
+    ordering = ('-create_time', '-post_id')
+    post_ordering = ('-create_time', '-id')
+
+    def fetch(self, queryset, values, reverse, limit):
+        pushed = super(FeedPagination, self).fetch(queryset, values, reverse, limit)
+        pulled = self.fetch_pulled(self.request.user.pk, values, reverse, limit)
+        if not pulled:
+            return pushed
+        merged = heapq.merge(pushed, pulled, key=lambda entry: (entry.create_time, entry.post_id), reverse=not reverse)
+        entries, seen = [], set()
+        for entry in merged:
+            if entry.post_id in seen:
+                continue
+            seen.add(entry.post_id)
+            entries.append(entry)
+            if len(entries) == limit:
+                break
+        return entries
+
+    def fetch_pulled(self, user_id, values, reverse, limit):
+        authors = list(Follow.objects.filter(follower_id=user_id, following__high_fanout=True)
+                       .values_list('following_id', flat=True))
+        if not authors:
+            return []
+        # One LIMITed range scan per author on the (author, create_time, id)
+        # index, sent as a single UNION ALL. Each row carries the index of its
+        # author's run; every run comes back already in page order, so the k
+        # runs are merged lazily and the merge stops at `limit` entries.
+        ordering = self.get_ordering(reverse, self.post_ordering)
+        queries = []
+        for run, author_id in enumerate(authors):
+            posts = Post.objects.filter(author_id=author_id).order_by(*ordering)
+            if values is not None:
+                posts = self.after(posts, values, reverse, self.post_ordering)
+            queries.append(posts.annotate(run=Value(run)).values_list('run', 'create_time', 'id')[:limit])
+        rows = queries[0].union(*queries[1:], all=True) if len(queries) > 1 else queries[0]
+        runs = [[] for _ in authors]
+        for run, create_time, post_id in rows:
+            runs[run].append(Timeline(user_id=user_id, post_id=post_id, create_time=create_time))
+        merged = heapq.merge(*runs, key=lambda entry: (entry.create_time, entry.post_id), reverse=not reverse)
+        return list(itertools.islice(merged, limit))
@@ -0,0 +1,189 @@
+import io
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps
+
+RENDITIONS = getattr(settings, 'POST_IMAGE_RENDITIONS', {'thumbnail': 320, 'feed': 1080, 'full': 2048})
+RENDITION_FORMAT = getattr(settings, 'POST_IMAGE_FORMAT', 'WEBP')
+RENDITION_QUALITY = getattr(settings, 'POST_IMAGE_QUALITY', 80)
+WORKERS = getattr(settings, 'POST_IMAGE_WORKERS', 2)
+STORE_WORKERS = getattr(settings, 'POST_IMAGE_STORE_WORKERS', 2)
+PLACEHOLDER_COMPONENTS = (4, 3)
+PLACEHOLDER_SOURCE = 32
+BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_store_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_renditions(data, widths, image_format, quality):
+    # Runs in a worker process, so it only touches bytes and Pillow. The
+    # transpose applies the EXIF orientation; re-encoding without passing
+    # `exif` or `icc_profile` drops the metadata.
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        results = {}
+        for name, width in widths.items():
+            width = min(width, image.width)
+            height = max(round(image.height * width / image.width), 1)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=quality, method=4)
+            results[name] = (width, height, buffer.getvalue())
+        return image.width, image.height, results
+
+
+def image_metadata(image_file):
+    # Dimensions, dominant colour and a BlurHash placeholder, cheap enough to
+    # run during the upload request: JPEG draft mode decodes at 1/8 scale.
+    with Image.open(image_file) as original:
+        width, height = original.size
+        if original.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            width, height = height, width
+        original.draft('RGB', (PLACEHOLDER_SOURCE * 4, PLACEHOLDER_SOURCE * 4))
+        small = ImageOps.exif_transpose(original).convert('RGB')
+    if hasattr(image_file, 'seek'):
+        # Leave uploads rewound for the storage backend.
+        image_file.seek(0)
+    small.thumbnail((PLACEHOLDER_SOURCE, PLACEHOLDER_SOURCE))
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': dominant_color(small),
+        'image_placeholder': blurhash(small, *PLACEHOLDER_COMPONENTS),
+    }
+
+
+def dominant_color(image):
+    palette = image.quantize(colors=5)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def blurhash(image, x_components, y_components):
+    # https://github.com/woltapp/blurhash/blob/master/Algorithm.md
+    width, height = image.size
+    pixels = [[srgb_to_linear(channel) for channel in pixel] for pixel in image.getdata()]
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            normalisation = 1 if i == 0 and j == 0 else 2
+            red = green = blue = 0.0
+            for y in range(height):
+                basis_y = math.cos(math.pi * j * y / height)
+                for x in range(width):
+                    basis = normalisation * math.cos(math.pi * i * x / width) * basis_y
+                    r, g, b = pixels[y * width + x]
+                    red += basis * r
+                    green += basis * g
+                    blue += basis * b
+            scale = 1 / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = encode_base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, math.floor(max(abs(value) for factor in ac for value in factor) * 166 - 0.5)))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1
+    result += encode_base83(quantised_max, 1)
+    result += encode_base83((linear_to_srgb(dc[0]) << 16) + (linear_to_srgb(dc[1]) << 8) + linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (max(0, min(18, math.floor(math.copysign(abs(value / maximum) ** 0.5, value) * 9 + 9.5)))
+                   for value in factor)
+        result += encode_base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def srgb_to_linear(value):
+    value = value / 255
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def encode_base83(value, length):
+    return ''.join(BASE83[value // 83 ** (length - i - 1) % 83] for i in range(length))
+
+
+def read_metadata(data):
+    return image_metadata(io.BytesIO(data))
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a process that holds DB connections and threads is unsafe.
+            _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def get_store_executor():
+    # Done callbacks run on the process pool's management thread, which must
+    # keep collecting results; saving and the ORM update happen here instead.
+    global _store_executor
+    with _executor_lock:
+        if _store_executor is None:
+            _store_executor = ThreadPoolExecutor(max_workers=STORE_WORKERS, thread_name_prefix='renditions')
+    return _store_executor
+
+
+def process_post_image(post):
+    # Called after the post is committed; the request returns without waiting.
+    name = post.image.name
+    with post.image.open('rb') as image_file:
+        data = image_file.read()
+    future = get_executor().submit(render_renditions, data, RENDITIONS, RENDITION_FORMAT, RENDITION_QUALITY)
+    future.add_done_callback(lambda done: get_store_executor().submit(store_renditions, post.pk, name, done))
+
+
+def store_renditions(post_id, name, future):
+    from post.cache import invalidate_post
+    from post.models import Post
+    from shared.storage import release_files
+
+    close_old_connections()
+    try:
+        width, height, results = future.result()
+        base = os.path.splitext(os.path.basename(name))[0]
+        upload_to = Post._meta.get_field('image').upload_to
+        extension = RENDITION_FORMAT.lower()
+        renditions = {}
+        for rendition, (rendition_width, rendition_height, content) in results.items():
+            path = default_storage.save(f"{upload_to}{base}_{rendition}.{extension}", ContentFile(content))
+            renditions[rendition] = {'path': path, 'width': rendition_width, 'height': rendition_height}
+        with transaction.atomic():
+            # Skip if the image was replaced while we were working on it.
+            updated = Post.objects.filter(pk=post_id, image=name).update(
+                image_width=width, image_height=height, renditions=renditions,
+            )
+            if updated:
+                invalidate_post(post_id)
+            else:
+                release_files(*[rendition['path'] for rendition in renditions.values()])
+    except Exception:
+        logger.exception("Storing renditions of post %s failed", post_id)
+    finally:
+        connection.close()
@@ -0,0 +1,51 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from post.cache import invalidate_post
+from post.images import get_executor, read_metadata
+from post.models import Post
+
+
+class Command(BaseCommand):
+    help = "Compute dimensions, dominant colour and placeholder for existing post images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--all', action='store_true', help="Recompute posts that already have a placeholder")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only('id', 'image').order_by('pk')
+        if not options['all']:
+            posts = posts.filter(image_placeholder='')
+        executor = get_executor()
+        done = failed = 0
+        iterator = posts.iterator(chunk_size=options['batch_size'])
+        while batch := list(islice(iterator, options['batch_size'])):
+            # Reading stays here (storage may be remote); decoding runs in the pool.
+            futures = {}
+            for post in batch:
+                try:
+                    with post.image.open('rb') as image_file:
+                        futures[post] = executor.submit(read_metadata, image_file.read())
+                except OSError as error:
+                    failed += 1
+                    self.stderr.write(f"{post.pk}: {error}")
+            updated = []
+            for post, future in futures.items():
+                try:
+                    metadata = future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"{post.pk}: {error}")
+                    continue
+                for field, value in metadata.items():
+                    setattr(post, field, value)
+                updated.append(post)
+            with transaction.atomic():
+                Post.objects.bulk_update(updated, ['image_width', 'image_height', 'image_color', 'image_placeholder'])
+                invalidate_post(*[post.pk for post in updated])
+            done += len(updated)
+            self.stdout.write(f"{done} ta post yangilandi")
+        self.stdout.write(self.style.SUCCESS(f"Tayyor: {done} ta post, {failed} ta xato"))
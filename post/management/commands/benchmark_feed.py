@@ -0,0 +1,83 @@
+import statistics
+import time
+import uuid
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from post.feed import FeedPagination, fan_out_post
+from post.models import Post, Timeline
+from users.models import User, Follow
+
+
+class Command(BaseCommand):
+    help = "Compare push and pull feed modes: timeline rows written per post and feed page latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=5000)
+        parser.add_argument('--authors', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--reads', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(**options)
+            # Nothing the benchmark creates is kept.
+            transaction.set_rollback(True)
+
+    def run(self, followers, authors, posts, reads, page_size, **kwargs):
+        author = self.make_users(1, 'bench-author')[0]
+        reader = self.make_users(1, 'bench-reader')[0]
+        audience = self.make_users(followers, 'bench-follower')
+        others = self.make_users(authors, 'bench-other')
+        Follow.objects.bulk_create(
+            [Follow(id=uuid.uuid4(), follower=user, following=author) for user in audience + [reader]]
+            + [Follow(id=uuid.uuid4(), follower=reader, following=other) for other in others]
+        )
+        for other in others:
+            for post in self.make_posts(other, posts):
+                fan_out_post(post, threshold=followers + 2)
+
+        for mode, threshold in (('push', followers + 2), ('pull', 1)):
+            User.objects.filter(pk=author.pk).update(high_fanout=False)
+            rows_before = Timeline.objects.count()
+            started = time.perf_counter()
+            for post in self.make_posts(author, posts):
+                fan_out_post(post, threshold=threshold)
+            write_ms = (time.perf_counter() - started) * 1000 / posts
+            rows = (Timeline.objects.count() - rows_before) / posts
+            read_ms = self.read_latency(reader, reads, page_size)
+            self.stdout.write(
+                f"{mode}: {rows:.0f} timeline rows/post, {write_ms:.2f} ms/post write, "
+                f"{read_ms:.2f} ms median feed page read"
+            )
+            Timeline.objects.filter(post__author=author).delete()
+            Post.objects.filter(author=author).delete()
+
+    @staticmethod
+    def make_users(count, prefix):
+        return User.objects.bulk_create([
+            User(id=uuid.uuid4(), username=f"{prefix}-{uuid.uuid4().hex[:12]}", password='!')
+            for _ in range(count)
+        ], batch_size=1000)
+
+    @staticmethod
+    def make_posts(author, count):
+        posts = []
+        for i in range(count):
+            posts.append(Post.objects.create(id=uuid.uuid4(), author=author, image='post_images/bench.jpg',
+                                             caption=f"bench {i}"))
+        return posts
+
+    @staticmethod
+    def read_latency(reader, reads, page_size):
+        paginator = FeedPagination()
+        paginator.request = SimpleNamespace(user=reader)
+        timings = []
+        for _ in range(reads):
+            started = time.perf_counter()
+            paginator.fetch(Timeline.objects.filter(user=reader), None, False, page_size + 1)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,67 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from post.counter_buffer import like_counters
+from post.models import Post, PostLike
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure like toggle throughput with many concurrent likers on one post, direct vs write-behind counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likers', type=int, default=32)
+        parser.add_argument('--taps', type=int, default=51)
+
+    def handle(self, *args, **options):
+        likers, taps = options['likers'], options['taps']
+        # The worker threads use their own connections, so the fixtures are
+        # committed and removed again at the end.
+        users = User.objects.bulk_create([
+            User(id=uuid.uuid4(), username=f"bench-liker-{uuid.uuid4().hex[:12]}", password='!')
+            for _ in range(likers)
+        ])
+        post = Post.objects.create(id=uuid.uuid4(), author=users[0], image='post_images/bench.jpg', caption='bench')
+        try:
+            for mode, write_behind in (('direct', False), ('write-behind', True)):
+                elapsed, errors = self.hammer(users, post, taps, write_behind)
+                like_counters.flush(wait=True)
+                post.refresh_from_db()
+                rows = PostLike.objects.filter(post=post).count()
+                self.stdout.write(
+                    f"{mode}: {likers * taps / elapsed:.0f} toggles/s over {likers} likers, "
+                    f"{errors} errors, likes_count={post.likes_count} rows={rows}"
+                )
+                PostLike.objects.filter(post=post).delete()
+                like_counters.flush(wait=True)
+                Post.objects.filter(pk=post.pk).update(likes_count=0)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    @staticmethod
+    def hammer(users, post, taps, write_behind):
+        errors = []
+        start = threading.Barrier(len(users) + 1)
+
+        def tap(user):
+            try:
+                start.wait()
+                for _ in range(taps):
+                    PostLike.objects.toggle(user.pk, post.pk, write_behind=write_behind)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started, len(errors)
@@ -0,0 +1,91 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from post.counter_buffer import like_counters, DELTA_TABLE
+from post.models import Post, Comment, PostLike, CommentLike, SavePost, count_subquery
+
+
+COUNTERS = {
+    Post: {
+        'comments_count': (Comment.objects.all(), 'post'),
+        'saves_count': (SavePost.post.through.objects.all(), 'post'),
+    },
+    Comment: {
+        'replies_count': (Comment.objects.all(), 'parent'),
+    },
+}
+LIKES = {
+    Post: (PostLike, 'post'),
+    Comment: (CommentLike, 'comment'),
+}
+
+
+class Command(BaseCommand):
+    help = "Recount denormalized like/comment/save counters on posts and comments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, counters in COUNTERS.items():
+            fixed = self.reconcile(model, counters, options['batch_size'])
+            self.stdout.write(f"{model.__name__}: {fixed} ta yozuv tuzatildi")
+
+    def reconcile(self, model, counters, batch_size):
+        annotations = {
+            f'{field}_actual': count_subquery(queryset, related)
+            for field, (queryset, related) in counters.items()
+        }
+        fixed = 0
+        last_pk = None
+        while True:
+            with transaction.atomic():
+                # No flusher may apply deltas while this batch is recounted.
+                like_counters.lock_deltas()
+                # FOR NO KEY UPDATE keeps concurrent like/comment inserts flowing
+                # while the counter increments for this batch wait for us.
+                batch = model.objects.select_for_update(no_key=True).order_by('pk')
+                if last_pk is not None:
+                    batch = batch.filter(pk__gt=last_pk)
+                batch = list(batch.annotate(**annotations).only('pk', *counters)[:batch_size])
+                if not batch:
+                    break
+                changed = []
+                for obj in batch:
+                    dirty = False
+                    for field in counters:
+                        actual = getattr(obj, f'{field}_actual')
+                        if getattr(obj, field) != actual:
+                            setattr(obj, field, actual)
+                            dirty = True
+                    if dirty:
+                        changed.append(obj)
+                model.objects.bulk_update(changed, list(counters))
+                changed = {obj.pk for obj in changed} | self.reconcile_likes(model, [obj.pk for obj in batch])
+            fixed += len(changed)
+            last_pk = batch[-1].pk
+        return fixed
+
+    @staticmethod
+    def reconcile_likes(model, pks):
+        # Likes no longer touch the target row (see post.counter_buffer), so
+        # the row lock does not hold them back. Instead one statement, on one
+        # snapshot, recounts the likes and drops the pending deltas: a like
+        # committed later is neither counted nor dropped, and its delta is
+        # applied by the next flush.
+        like_model, related = LIKES[model]
+        qn = connection.ops.quote_name
+        table = qn(model._meta.db_table)
+        like_table, column = qn(like_model._meta.db_table), qn(like_model._meta.get_field(related).column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH drained AS ("
+                f"DELETE FROM {DELTA_TABLE} WHERE target_type = %s AND target_id = ANY(%s::uuid[])"
+                f"), actual AS ("
+                f"SELECT t.id, (SELECT count(*) FROM {like_table} WHERE {column} = t.id) AS total "
+                f"FROM unnest(%s::uuid[]) AS t(id)"
+                f") UPDATE {table} SET likes_count = actual.total FROM actual "
+                f"WHERE {table}.id = actual.id AND {table}.likes_count <> actual.total RETURNING {table}.id",
+                [model._meta.db_table, pks, pks],
+            )
+            return {row[0] for row in cursor.fetchall()}
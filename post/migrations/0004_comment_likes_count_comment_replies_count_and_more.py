@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import uuid
+
+
+def count_subquery(queryset, field):
+    # Frozen copy of post.models.count_subquery as of this migration.
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('post', 'Post')
+    Comment = apps.get_model('post', 'Comment')
+    PostLike = apps.get_model('post', 'PostLike')
+    CommentLike = apps.get_model('post', 'CommentLike')
+    SavePost = apps.get_model('post', 'SavePost')
+    Post.objects.update(
+        likes_count=count_subquery(PostLike.objects.all(), 'post'),
+        comments_count=count_subquery(Comment.objects.all(), 'post'),
+        saves_count=count_subquery(SavePost.post.through.objects.all(), 'post'),
+    )
+    Comment.objects.update(
+        likes_count=count_subquery(CommentLike.objects.all(), 'comment'),
+        replies_count=count_subquery(Comment.objects.all(), 'parent'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0003_alter_comment_id_alter_commentlike_id_alter_post_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='replies_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='saves_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('8a78989a-20e8-4387-bedd-ab4d79afe739'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('8a78989a-20e8-4387-bedd-ab4d79afe739'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('8a78989a-20e8-4387-bedd-ab4d79afe739'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('8a78989a-20e8-4387-bedd-ab4d79afe739'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savepost',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('8a78989a-20e8-4387-bedd-ab4d79afe739'), primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:38
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0004_comment_likes_count_comment_replies_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('28551578-d811-48a5-a0ce-24602327224e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('28551578-d811-48a5-a0ce-24602327224e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('28551578-d811-48a5-a0ce-24602327224e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('28551578-d811-48a5-a0ce-24602327224e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savepost',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('28551578-d811-48a5-a0ce-24602327224e'), primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['create_time', 'id'], name='posts_create_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'create_time', 'id'], name='posts_author_create_time_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:39
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0005_alter_comment_id_alter_commentlike_id_alter_post_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('ba1ca591-ab20-4fac-b2ab-6d7b2f210fc7'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('ba1ca591-ab20-4fac-b2ab-6d7b2f210fc7'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('ba1ca591-ab20-4fac-b2ab-6d7b2f210fc7'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('ba1ca591-ab20-4fac-b2ab-6d7b2f210fc7'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savepost',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('ba1ca591-ab20-4fac-b2ab-6d7b2f210fc7'), primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'create_time', 'id'], name='comment_post_create_time_idx'),
+        ),
+    ]
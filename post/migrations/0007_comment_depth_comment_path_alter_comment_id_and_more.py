@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:41
+
+from django.db import migrations, models
+import uuid
+
+COMMENT_PATH_SEGMENT = 16
+
+
+def comment_path_segment(moment):
+    # Frozen copy of post.models.comment_path_segment as of this migration.
+    micros = int(moment.timestamp() * 1000000)
+    digits = ''
+    while micros:
+        micros, rest = divmod(micros, 36)
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'[rest] + digits
+    return digits.rjust(11, '0') + uuid.uuid4().hex[:COMMENT_PATH_SEGMENT - 11]
+
+
+def fill_paths(apps, schema_editor):
+    Comment = apps.get_model('post', 'Comment')
+    level = list(Comment.objects.filter(parent__isnull=True).only('id', 'create_time'))
+    depth = 0
+    while level:
+        parents = {}
+        for comment in level:
+            parent_path = comment.parent.path if depth else ''
+            comment.depth = depth
+            comment.path = parent_path + comment_path_segment(comment.create_time)
+            parents[comment.pk] = comment
+        Comment.objects.bulk_update(level, ['depth', 'path'], batch_size=1000)
+        level = list(Comment.objects.filter(parent_id__in=list(parents)).only('id', 'create_time', 'parent_id'))
+        for comment in level:
+            comment.parent = parents[comment.parent_id]
+        depth += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0006_alter_comment_id_alter_commentlike_id_alter_post_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(db_collation='C', default='', editable=False, max_length=1600),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('5415c4f5-eef5-4cf0-88fe-d679f19621f2'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('5415c4f5-eef5-4cf0-88fe-d679f19621f2'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('5415c4f5-eef5-4cf0-88fe-d679f19621f2'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('5415c4f5-eef5-4cf0-88fe-d679f19621f2'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savepost',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('5415c4f5-eef5-4cf0-88fe-d679f19621f2'), primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path', 'id'], name='comment_post_path_idx'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('post', '0007_comment_depth_comment_path_alter_comment_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savepost',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False),
+        ),
+        migrations.CreateModel(
+            name='Timeline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='post.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'timelines',
+                'indexes': [models.Index(fields=['user', 'create_time', 'id'], name='timeline_user_time_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='timeline',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='TimelineUnique'),
+        ),
+    ]
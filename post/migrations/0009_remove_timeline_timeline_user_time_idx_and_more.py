@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:43
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0008_alter_comment_id_alter_commentlike_id_alter_post_id_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timeline',
+            name='timeline_user_time_idx',
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savepost',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='timeline',
+            index=models.Index(fields=['user', 'create_time', 'post'], name='timeline_user_time_idx'),
+        ),
+    ]
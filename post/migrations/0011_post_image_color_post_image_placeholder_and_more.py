@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:50
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0010_post_image_height_post_image_width_post_renditions_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, default='', editable=False, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('a091d750-5ffd-4ae3-8c12-d4f8a7133fec'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='commentlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('a091d750-5ffd-4ae3-8c12-d4f8a7133fec'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('a091d750-5ffd-4ae3-8c12-d4f8a7133fec'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='postlike',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('a091d750-5ffd-4ae3-8c12-d4f8a7133fec'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='savepost',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('a091d750-5ffd-4ae3-8c12-d4f8a7133fec'), primary_key=True, serialize=False),
+        ),
+    ]
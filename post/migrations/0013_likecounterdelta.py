@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0012_alter_comment_id_alter_commentlike_id_alter_post_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeCounterDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(max_length=32)),
+                ('target_id', models.UUIDField()),
+                ('delta', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'like_counter_deltas',
+                'indexes': [models.Index(fields=['target_type', 'target_id'], name='like_delta_target_idx')],
+            },
+        ),
+    ]
@@ -1,13 +1,59 @@
+import uuid
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, connection, transaction
 from django.core.validators import FileExtensionValidator, MaxLengthValidator
-from django.db.models import UniqueConstraint
+from django.db.models import UniqueConstraint, Count, Exists, OuterRef, Subquery, Sum, Value, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
+from post.counter_buffer import like_counters, DELTA_TABLE
 from shared.models import BaseModel
 
 
 User = get_user_model()
 
+# Comment.path is the concatenation of fixed-width segments, one per ancestor
+# and one for the comment itself. Each segment sorts by creation time, so a
+# subtree is the key range [path, path + '~') in path order.
+COMMENT_PATH_SEGMENT = 16
+COMMENT_MAX_DEPTH = 100
+COMMENT_PATH_END = '~'
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+class PendingLikesMixin:
+
+    def with_pending_likes(self):
+        # likes_count changes still waiting in like_counter_deltas, so counts
+        # read here agree with what toggling a like returns.
+        return self.annotate(pending_likes=Coalesce(Subquery(
+            LikeCounterDelta.objects.for_targets(self.model, [OuterRef('pk')]).order_by().values('target_id')
+            .annotate(total=Sum('delta')).values('total')
+        ), 0))
+
+
+class PostQuerySet(PendingLikesMixin, models.QuerySet):
+
+    def with_me_liked(self, user=None):
+        if user is not None and user.is_authenticated:
+            me_liked = Exists(PostLike.objects.filter(post=OuterRef('pk'), author_id=user.pk))
+        else:
+            me_liked = Value(False)
+        return self.annotate(me_liked=me_liked)
+
+    def with_stats(self, user=None):
+        return self.select_related('author').with_me_liked(user).with_pending_likes()
+
 
 class Post(BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
@@ -15,14 +61,75 @@ class Post(BaseModel):
         FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])
     ])
     caption = models.TextField(validators=[MaxLengthValidator(1000)])
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, default='', editable=False)
+    image_placeholder = models.CharField(max_length=64, blank=True, default='', editable=False)
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    saves_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         db_table = 'posts'
+        indexes = [
+            models.Index(fields=['create_time', 'id'], name='posts_create_time_id_idx'),
+            models.Index(fields=['author', 'create_time', 'id'], name='posts_author_create_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author.fullname} for post {self.caption}"
 
 
+class CommentQuerySet(PendingLikesMixin, models.QuerySet):
+
+    def with_stats(self, user=None):
+        if user is not None and user.is_authenticated:
+            me_liked = Exists(CommentLike.objects.filter(comment=OuterRef('pk'), author_id=user.pk))
+        else:
+            me_liked = Value(False)
+        return self.select_related('author').annotate(me_liked=me_liked).with_pending_likes()
+
+    def descendants_of(self, comments):
+        return self.filter(reduce(or_, [
+            Q(post_id=comment.post_id, path__gt=comment.path, path__lt=comment.path + COMMENT_PATH_END)
+            for comment in comments
+        ]))
+
+
+def comment_path_segment(moment=None):
+    micros = int((moment or timezone.now()).timestamp() * 1000000)
+    digits = ''
+    while micros:
+        micros, rest = divmod(micros, 36)
+        digits = '0123456789abcdefghijklmnopqrstuvwxyz'[rest] + digits
+    return digits.rjust(11, '0') + uuid.uuid4().hex[:COMMENT_PATH_SEGMENT - 11]
+
+
+def build_comment_thread(roots, replies, max_depth):
+    # Hangs `replies` under their parents as `obj.thread`. Replies nested deeper
+    # than `max_depth` are flattened into their ancestor's list at that depth.
+    children = defaultdict(list)
+    for reply in replies:
+        children[reply.parent_id].append(reply)
+    stack = []
+    for root in roots:
+        root.thread = []
+        stack.append((root, 0, root))
+    while stack:
+        node, depth, holder = stack.pop()
+        for child in children.pop(node.pk, ()):
+            child.thread = []
+            holder.thread.append(child)
+            stack.append((child, depth + 1, child if depth + 1 < max_depth else holder))
+    for node in roots + list(replies):
+        if hasattr(node, 'thread'):
+            node.thread.sort(key=lambda c: (c.create_time, c.pk))
+    return roots
+
+
 class Comment(BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -34,15 +141,231 @@ class Comment(BaseModel):
         null=True,
         blank=True,
     )
+    likes_count = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)
+    depth = models.PositiveSmallIntegerField(default=0)
+    path = models.CharField(max_length=COMMENT_PATH_SEGMENT * COMMENT_MAX_DEPTH, db_collation='C', editable=False,
+                            default='')
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'create_time', 'id'], name='comment_post_create_time_idx'),
+            models.Index(fields=['post', 'path', 'id'], name='comment_post_path_idx'),
+        ]
 
     def __str__(self):
         return f"{self.author} - {self.comment}"
 
+    def make_path(self):
+        if self.path:
+            return
+        if self.parent_id and self.parent.depth + 1 >= COMMENT_MAX_DEPTH:
+            # Keep paths bounded: too-deep replies join their parent's siblings.
+            self.parent = self.parent.parent
+        if self.parent_id:
+            self.depth = self.parent.depth + 1
+            self.path = self.parent.path + comment_path_segment()
+        else:
+            self.depth = 0
+            self.path = comment_path_segment()
+
+    def save(self, *args, **kwargs):
+        self.make_path()
+        super(Comment, self).save(*args, **kwargs)
+
+
+class LikeManager(models.Manager):
+    # Toggles and bulk-sets likes in raw statements: DELETE ... RETURNING and
+    # INSERT ... ON CONFLICT DO NOTHING. These bypass model signals, so the
+    # target's likes_count is maintained here, either chained into the same
+    # statement or, with LIKE_COUNTER_WRITE_BEHIND, through like_counters.
+
+    def __init__(self, target):
+        super(LikeManager, self).__init__()
+        self.target = target
+
+    def tables(self):
+        field = self.model._meta.get_field(self.target)
+        qn = connection.ops.quote_name
+        return (field.related_model, qn(self.model._meta.db_table), qn(field.related_model._meta.db_table),
+                qn(field.column))
+
+    @staticmethod
+    def use_write_behind(write_behind):
+        if write_behind is None:
+            return getattr(settings, 'LIKE_COUNTER_WRITE_BEHIND', True)
+        return write_behind
+
+    def toggle(self, author_id, target_id, write_behind=None):
+        if self.use_write_behind(write_behind):
+            return self.toggle_buffered(author_id, target_id)
+        target_model, like_table, target_table, target_column = self.tables()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH deleted AS ("
+                f"DELETE FROM {like_table} WHERE author_id = %s AND {target_column} = %s RETURNING {target_column}"
+                f") UPDATE {target_table} SET likes_count = GREATEST(likes_count - 1, 0) "
+                f"WHERE id IN (SELECT {target_column} FROM deleted) RETURNING likes_count",
+                [author_id, target_id],
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                return False, row[0]
+            cursor.execute(
+                f"WITH inserted AS ("
+                f"INSERT INTO {like_table} (id, create_time, update_time, author_id, {target_column}) "
+                f"SELECT %s, now(), now(), %s, id FROM {target_table} WHERE id = %s "
+                f"ON CONFLICT DO NOTHING RETURNING {target_column}"
+                f") UPDATE {target_table} SET likes_count = likes_count + 1 "
+                f"WHERE id IN (SELECT {target_column} FROM inserted) RETURNING likes_count",
+                [uuid.uuid4(), author_id, target_id],
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                return True, row[0]
+            # Either a concurrent tap inserted the same like first, or the
+            # target does not exist.
+            cursor.execute(f"SELECT likes_count FROM {target_table} WHERE id = %s", [target_id])
+            row = cursor.fetchone()
+        if row is None:
+            raise target_model.DoesNotExist
+        return True, row[0]
+
+    def toggle_buffered(self, author_id, target_id):
+        # Same toggle without touching the target row: the statement that
+        # changes the like also appends its delta to like_counter_deltas, and
+        # returns the stored count plus the deltas still pending for it.
+        target_model, like_table, target_table, target_column = self.tables()
+        target_type = target_model._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH deleted AS ("
+                f"DELETE FROM {like_table} WHERE author_id = %s AND {target_column} = %s RETURNING {target_column}"
+                f"), recorded AS ("
+                f"INSERT INTO {DELTA_TABLE} (target_type, target_id, delta) SELECT %s, {target_column}, -1 FROM deleted"
+                f") SELECT (SELECT count(*) FROM deleted), {self.pending_count(target_table)} "
+                f"FROM {target_table} WHERE id = %s",
+                [author_id, target_id, target_type, target_type, target_id],
+            )
+            row = cursor.fetchone()
+            if row is not None and row[0]:
+                liked, delta = False, -1
+            else:
+                cursor.execute(
+                    f"WITH inserted AS ("
+                    f"INSERT INTO {like_table} (id, create_time, update_time, author_id, {target_column}) "
+                    f"SELECT %s, now(), now(), %s, id FROM {target_table} WHERE id = %s "
+                    f"ON CONFLICT DO NOTHING RETURNING {target_column}"
+                    f"), recorded AS ("
+                    f"INSERT INTO {DELTA_TABLE} (target_type, target_id, delta) SELECT %s, {target_column}, 1 FROM inserted"
+                    f") SELECT (SELECT count(*) FROM inserted), {self.pending_count(target_table)} "
+                    f"FROM {target_table} WHERE id = %s",
+                    [uuid.uuid4(), author_id, target_id, target_type, target_type, target_id],
+                )
+                row = cursor.fetchone()
+                liked, delta = True, row[0] if row is not None else 0
+            if row is None:
+                raise target_model.DoesNotExist
+            if delta:
+                like_counters.notify_on_commit()
+        # The delta recorded by this statement is not visible to its own SELECT.
+        return liked, max(row[1] + delta, 0)
+
+    @staticmethod
+    def pending_count(target_table):
+        # Takes the target type as a parameter.
+        return (f"likes_count + COALESCE((SELECT SUM(delta) FROM {DELTA_TABLE} "
+                f"WHERE target_type = %s AND target_id = {target_table}.id), 0)")
+
+    def bulk_set(self, author_id, like_ids, unlike_ids, write_behind=None):
+        # One statement deletes the unlikes, inserts the likes (skipping ones
+        # that already exist or whose target is gone) and works out the net
+        # counter change per target, which it either applies right away or
+        # appends to like_counter_deltas; a second reads the counts, with
+        # pending deltas included.
+        # Returns {target_id: likes_count} for the targets that exist.
+        write_behind = self.use_write_behind(write_behind)
+        target_model, like_table, target_table, target_column = self.tables()
+        target_type = target_model._meta.db_table
+        like_ids, unlike_ids = list(like_ids), list(unlike_ids)
+        params = [author_id, unlike_ids, author_id, [uuid.uuid4() for _ in like_ids], like_ids]
+        if write_behind:
+            apply_delta = (
+                f", recorded AS ("
+                f"INSERT INTO {DELTA_TABLE} (target_type, target_id, delta) "
+                f"SELECT %s, target_id, SUM(change) FROM delta GROUP BY target_id HAVING SUM(change) <> 0 RETURNING 1"
+                f") SELECT count(*) FROM recorded"
+            )
+            params.append(target_type)
+            count, count_params = self.pending_count(target_table), [target_type]
+        else:
+            apply_delta = (
+                f" UPDATE {target_table} SET likes_count = GREATEST({target_table}.likes_count + d.change, 0) "
+                f"FROM (SELECT target_id, SUM(change) AS change FROM delta GROUP BY target_id) d "
+                f"WHERE {target_table}.id = d.target_id"
+            )
+            count, count_params = 'likes_count', []
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH deleted AS ("
+                f"DELETE FROM {like_table} WHERE author_id = %s AND {target_column} = ANY(%s::uuid[]) "
+                f"RETURNING {target_column} AS target_id"
+                f"), inserted AS ("
+                f"INSERT INTO {like_table} (id, create_time, update_time, author_id, {target_column}) "
+                f"SELECT new.id, now(), now(), %s, new.target_id FROM unnest(%s::uuid[], %s::uuid[]) AS new(id, target_id) "
+                f"JOIN {target_table} target ON target.id = new.target_id "
+                f"ON CONFLICT DO NOTHING RETURNING {target_column} AS target_id"
+                f"), delta AS ("
+                f"SELECT target_id, -1 AS change FROM deleted UNION ALL SELECT target_id, 1 FROM inserted"
+                f"){apply_delta}",
+                params,
+            )
+            if write_behind and cursor.fetchone()[0]:
+                like_counters.notify_on_commit()
+            cursor.execute(
+                f"SELECT id, {count} FROM {target_table} WHERE id = ANY(%s::uuid[])",
+                count_params + [like_ids + unlike_ids],
+            )
+            counts = {pk: max(likes_count, 0) for pk, likes_count in cursor.fetchall()}
+        return counts
+
+
+class LikeCounterDeltaQuerySet(models.QuerySet):
+
+    def for_targets(self, model, pks):
+        if len(pks) == 1:
+            return self.filter(target_type=model._meta.db_table, target_id=pks[0])
+        return self.filter(target_type=model._meta.db_table, target_id__in=pks)
+
+    def pending(self, model, pks):
+        # {target_id: net pending change} for the targets that have any.
+        return dict(self.for_targets(model, list(pks)).order_by().values('target_id')
+                    .annotate(total=Sum('delta')).values_list('target_id', 'total'))
+
+
+class LikeCounterDelta(models.Model):
+    # Pending likes_count changes; see post.counter_buffer.
+    target_type = models.CharField(max_length=32)
+    target_id = models.UUIDField()
+    delta = models.IntegerField()
+
+    objects = LikeCounterDeltaQuerySet.as_manager()
+
+    class Meta:
+        db_table = DELTA_TABLE
+        indexes = [
+            models.Index(fields=['target_type', 'target_id'], name='like_delta_target_idx'),
+        ]
+
 
 class PostLike(BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
 
+    objects = LikeManager('post')
+
     class Meta:
         constraints = [
             UniqueConstraint(
@@ -56,6 +379,8 @@ class CommentLike(BaseModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='likes')
 
+    objects = LikeManager('comment')
+
     class Meta:
         constraints = [
             UniqueConstraint(
@@ -72,3 +397,22 @@ class SavePost(BaseModel):
 
     def __str__(self):
         return f"{self.user} - {self.name}"
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    # Copy of post.create_time so a page of the feed never touches the posts table index.
+    create_time = models.DateTimeField()
+
+    class Meta:
+        db_table = 'timelines'
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'],
+                name='TimelineUnique'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', 'create_time', 'post'], name='timeline_user_time_idx'),
+        ]
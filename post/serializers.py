@@ -1,3 +1,4 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
 
 from post.models import Post, PostLike, Comment, CommentLike
@@ -19,6 +20,7 @@ class PostSerializer(serializers.ModelSerializer):
     post_comment_count = serializers.SerializerMethodField('get_post_comment_count')
     me_like = serializers.SerializerMethodField('get_me_like')
     post_saved_count = serializers.SerializerMethodField('get_post_saved_count')
+    renditions = serializers.SerializerMethodField('get_renditions')
 
     class Meta:
         model = Post
@@ -26,6 +28,11 @@ class PostSerializer(serializers.ModelSerializer):
             'id',
             'author',
             'image',
+            'image_width',
+            'image_height',
+            'image_color',
+            'image_placeholder',
+            'renditions',
             'caption',
             'create_time',
             'post_likes_count',
@@ -35,23 +42,33 @@ class PostSerializer(serializers.ModelSerializer):
         ]
 
     def get_post_likes_count(self, obj):
-        return obj.likes.count()
+        return max(obj.likes_count + getattr(obj, 'pending_likes', 0), 0)
 
     def get_post_comment_count(self, obj):
-        return obj.comments.count()
+        return obj.comments_count
 
     def get_me_like(self, obj):
+        if hasattr(obj, 'me_liked'):
+            return obj.me_liked
         request = self.context.get('request', None)
         if request and request.user.is_authenticated:
-            try:
-                like = PostLike.objects.get(author=request.user, post=obj)
-                return True
-            except:
-                return False
+            return PostLike.objects.filter(author=request.user, post=obj).exists()
         return False
 
     def get_post_saved_count(self, obj):
-        return obj.saves.count()
+        return obj.saves_count
+
+    def get_renditions(self, obj):
+        request = self.context.get('request', None)
+        renditions = {}
+        for name, rendition in obj.renditions.items():
+            url = default_storage.url(rendition['path'])
+            renditions[name] = {
+                'url': request.build_absolute_uri(url) if request else url,
+                'width': rendition['width'],
+                'height': rendition['height'],
+            }
+        return renditions
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -60,31 +77,33 @@ class CommentSerializer(serializers.ModelSerializer):
     comment_like_count = serializers.SerializerMethodField('get_comment_like_count')
     me_like = serializers.SerializerMethodField('get_me_like')
     replises = serializers.SerializerMethodField('get_replises')
-    post = serializers.UUIDField(read_only=True)
+    post = serializers.UUIDField(source='post_id', read_only=True)
+    parent = serializers.UUIDField(source='parent_id', read_only=True)
 
     class Meta:
         model = Comment
-        fields = ['id', 'author', 'post', 'comment', 'create_time', 'comment_like_count', 'me_like', 'replises']
+        fields = ['id', 'author', 'post', 'parent', 'depth', 'comment', 'create_time', 'comment_like_count', 'me_like',
+                  'replises']
+        read_only_fields = ['depth']
 
     def get_comment_like_count(self, obj):
-        return obj.likes.count()
+        return max(obj.likes_count + getattr(obj, 'pending_likes', 0), 0)
 
     def get_me_like(self, obj):
+        if hasattr(obj, 'me_liked'):
+            return obj.me_liked
         request = self.context.get('request', None)
         if request and request.user.is_authenticated:
-            try:
-                like = CommentLike.objects.get(author=request.user, comment=obj)
-                return True
-            except:
-                return False
+            return CommentLike.objects.filter(author=request.user, comment=obj).exists()
         return False
 
     def get_replises(self, obj):
-        if obj.childs.exists():
-            serializers = self.__class__(obj.child.all(), many=True, context=self.context)
+        # Only threads assembled by build_comment_thread() carry replies.
+        replies = getattr(obj, 'thread', None)
+        if replies:
+            serializers = self.__class__(replies, many=True, context=self.context)
             return serializers.data
-        else:
-            return None
+        return None
 
 
 class PostLikeSerializer(serializers.ModelSerializer):
@@ -105,3 +124,13 @@ class CommentLikeSerializer(serializers.ModelSerializer):
     class Meta:
         model = CommentLike
         fields = ['id', 'author', 'comment']
+
+
+class LikeOperationSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=['post', 'comment'])
+    id = serializers.UUIDField()
+    like = serializers.BooleanField()
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    operations = LikeOperationSerializer(many=True, allow_empty=False, max_length=100)
@@ -0,0 +1,114 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from post.cache import AUTHOR_FIELDS, invalidate_author, invalidate_post
+from post.counter_buffer import like_counters
+from post.models import Post, Comment, PostLike, CommentLike, SavePost, LikeManager
+from shared.storage import release_files
+from users.models import User
+
+
+def change_counter(model, pk, field, delta):
+    value = F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+    model.objects.filter(pk=pk).update(**{field: value})
+    if model is Post:
+        invalidate_post(pk)
+
+
+def change_likes(model, pk, delta):
+    if LikeManager.use_write_behind(None):
+        like_counters.record(model, {pk: delta})
+    else:
+        change_counter(model, pk, 'likes_count', delta)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    invalidate_post(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    # Saves that cannot change the author shown on posts (e.g. last_login on
+    # every login) leave the cached author alone.
+    if update_fields is None or set(update_fields) & set(AUTHOR_FIELDS):
+        invalidate_author(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    release_files(instance.image.name, *[rendition['path'] for rendition in instance.renditions.values()])
+
+
+@receiver(post_save, sender=PostLike)
+def post_like_created(sender, instance, created, **kwargs):
+    if created:
+        change_likes(Post, instance.post_id, 1)
+
+
+@receiver(post_delete, sender=PostLike)
+def post_like_deleted(sender, instance, **kwargs):
+    change_likes(Post, instance.post_id, -1)
+
+
+@receiver(post_save, sender=CommentLike)
+def comment_like_created(sender, instance, created, **kwargs):
+    if created:
+        change_likes(Comment, instance.comment_id, 1)
+
+
+@receiver(post_delete, sender=CommentLike)
+def comment_like_deleted(sender, instance, **kwargs):
+    change_likes(Comment, instance.comment_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Post, instance.post_id, 'comments_count', 1)
+        if instance.parent_id:
+            change_counter(Comment, instance.parent_id, 'replies_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_counter(Post, instance.post_id, 'comments_count', -1)
+    if instance.parent_id:
+        change_counter(Comment, instance.parent_id, 'replies_count', -1)
+
+
+def change_saves(saved_post_ids, delta):
+    value = F('saves_count') + delta if delta > 0 else Greatest(F('saves_count') + delta, 0)
+    Post.objects.filter(pk__in=saved_post_ids).update(saves_count=value)
+    invalidate_post(*saved_post_ids)
+
+
+@receiver(m2m_changed, sender=SavePost.post.through)
+def post_saved(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add' and pk_set:
+        if reverse:
+            change_counter(Post, instance.pk, 'saves_count', len(pk_set))
+        else:
+            change_saves(pk_set, 1)
+    elif action in ('pre_remove', 'pre_clear'):
+        # pk_set may name objects that were never linked, so count the rows
+        # that are actually about to go away.
+        if reverse:
+            links = sender.objects.filter(post_id=instance.pk)
+            if pk_set is not None:
+                links = links.filter(savepost_id__in=pk_set)
+            change_counter(Post, instance.pk, 'saves_count', -links.count())
+        else:
+            links = sender.objects.filter(savepost_id=instance.pk)
+            if pk_set is not None:
+                links = links.filter(post_id__in=pk_set)
+            change_saves(list(links.values_list('post_id', flat=True)), -1)
+
+
+@receiver(pre_delete, sender=SavePost)
+def save_post_deleted(sender, instance, **kwargs):
+    # Cascades into the auto-created through table do not send delete signals.
+    change_saves(list(instance.post.values_list('pk', flat=True)), -1)
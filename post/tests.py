@@ -1,3 +1,223 @@
-from django.test import TestCase
+import threading
+import uuid
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from post.cache import author_cache_key, post_cache_key, render_posts
+from post.counter_buffer import like_counters
+from post.models import Post, PostLike, Comment, CommentLike, Timeline
+from users.models import User, Follow
+
+
+def create_users(*usernames):
+    # bulk_create skips User.save(), so no password is hashed.
+    return User.objects.bulk_create([User(username=username, password='!', auth_status='done') for username in usernames])
+
+
+def api_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer ' + user.token()['access'])
+    return client
+
+
+class PostListQueryCountTests(TestCase):
+    page_sizes = (1, 5, 20)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.viewer = create_users('query-author', 'query-viewer')
+        Follow.objects.create(follower=cls.viewer, following=cls.author)
+        posts = Post.objects.bulk_create([
+            Post(author=cls.author, image='post_images/query.jpg', caption=f"post {i}") for i in range(25)
+        ])
+        Timeline.objects.bulk_create([
+            Timeline(user=user, post=post, create_time=post.create_time)
+            for post in posts for user in (cls.author, cls.viewer)
+        ])
+        PostLike.objects.bulk_create([PostLike(author=cls.viewer, post=post) for post in posts[::2]])
+        Comment.objects.bulk_create([
+            Comment(author=cls.viewer, post=post, comment='comment', path=f"{i:016d}") for i, post in enumerate(posts)
+        ])
+
+    def get_page(self, client, url, page_size):
+        # Cold representation cache, so every page renders its posts from the database.
+        cache.clear()
+        response = client.get(url, {'page_size': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']), page_size)
+        return response
+
+    def assertConstantQueries(self, client, url):
+        first, *others = self.page_sizes
+        with CaptureQueriesContext(connection) as queries:
+            self.get_page(client, url, first)
+        for page_size in others:
+            with self.subTest(url=url, page_size=page_size), self.assertNumQueries(len(queries)):
+                self.get_page(client, url, page_size)
+
+    def test_post_list(self):
+        self.assertConstantQueries(api_client(self.viewer), '/posts/list/')
+
+    def test_post_list_anonymous(self):
+        self.assertConstantQueries(APIClient(), '/posts/list/')
+
+    def test_own_post_list(self):
+        self.assertConstantQueries(api_client(self.author), '/posts/list/me/')
+
+    def test_feed(self):
+        self.assertConstantQueries(api_client(self.viewer), '/posts/feed/')
+
+
+class PostCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author, = create_users('cache-author')
+        self.post = Post.objects.create(author=self.author, image='post_images/cache.jpg', caption='old')
+        self.request = Request(APIRequestFactory().get('/posts/list/'))
+
+    def render(self):
+        data, = render_posts([self.post.pk], self.request)
+        return data
+
+    def test_late_write_of_old_row_is_not_served(self):
+        self.assertEqual(self.render()['caption'], 'old')
+        # A reader took the current (unset) version and loaded the row before
+        # the edit committed, then stores it after the invalidation.
+        stale = cache.get(post_cache_key(self.post.pk, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.caption = 'new'
+            self.post.save()
+        cache.set(post_cache_key(self.post.pk, 0), stale)
+        self.assertEqual(self.render()['caption'], 'new')
+
+    def test_author_edits_reach_cached_posts(self):
+        self.assertEqual(self.render()['author']['username'], 'cache-author')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.last_login = timezone.now()
+            self.author.save(update_fields=['last_login'])
+        self.assertIsNotNone(cache.get(author_cache_key(self.author.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'cache-renamed'
+            self.author.save()
+        self.assertEqual(self.render()['author']['username'], 'cache-renamed')
+
+
+@override_settings(LIKE_COUNTER_WRITE_BEHIND=True)
+class PendingLikeCountTests(TestCase):
+    # Nothing is flushed here (on_commit never runs in a TestCase), so every
+    # count below comes from pending like_counter_deltas rows.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.liker = create_users('pending-author', 'pending-liker')
+        cls.post = Post.objects.create(author=cls.author, image='post_images/pending.jpg', caption='pending')
+        cls.comment = Comment.objects.create(author=cls.author, post=cls.post, comment='pending', path='0' * 16)
+
+    def setUp(self):
+        cache.clear()
+        self.client = api_client(self.liker)
+
+    def post_count(self, data):
+        return next(item for item in data if item['id'] == str(self.post.pk))['post_likes_count']
+
+    def test_every_endpoint_agrees_with_the_toggle(self):
+        response = self.client.post(f'/posts/{self.post.pk}/likes/like/')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes_count, 0)
+        self.assertEqual(self.client.get(f'/posts/{self.post.pk}/').data['post_likes_count'], 1)
+        self.assertEqual(self.post_count(self.client.get('/posts/list/').data['data']), 1)
+
+        response = self.client.post('/posts/likes/batch/', {'operations': [
+            {'type': 'post', 'id': str(self.post.pk), 'like': False},
+            {'type': 'comment', 'id': str(self.comment.pk), 'like': True},
+        ]}, format='json')
+        self.assertEqual([item['likes_count'] for item in response.data['data']], [0, 1])
+        self.assertEqual(self.client.get(f'/posts/{self.post.pk}/').data['post_likes_count'], 0)
+        self.assertEqual(self.post_count(self.client.get('/posts/list/').data['data']), 0)
+        comments = self.client.get(f'/posts/{self.post.pk}/comments/').data['data']
+        self.assertEqual(comments[0]['comment_like_count'], 1)
+
+
+class LikeBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.liker = create_users('batch-author', 'batch-liker')
+        cls.post = Post.objects.create(author=cls.author, image='post_images/batch.jpg', caption='batch')
+        cls.comment = Comment.objects.create(author=cls.author, post=cls.post, comment='batch', path='0' * 16)
+        # Counted like a tap, so the comment starts with one like.
+        CommentLike.objects.create(author=cls.liker, comment=cls.comment)
+
+    def test_last_operation_wins_and_missing_targets_are_null(self):
+        missing = str(uuid.uuid4())
+        response = api_client(self.liker).post('/posts/likes/batch/', {'operations': [
+            {'type': 'post', 'id': str(self.post.pk), 'like': True},
+            {'type': 'comment', 'id': str(self.comment.pk), 'like': True},
+            {'type': 'post', 'id': missing, 'like': True},
+            {'type': 'post', 'id': str(self.post.pk), 'like': False},
+            {'type': 'comment', 'id': missing, 'like': False},
+            {'type': 'post', 'id': str(self.post.pk), 'like': True},
+            {'type': 'comment', 'id': str(self.comment.pk), 'like': False},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(item['type'], item['id'], item['liked'], item['likes_count'])
+                          for item in response.json()['data']], [
+            ('post', str(self.post.pk), True, 1),
+            ('post', missing, None, None),
+            ('comment', str(self.comment.pk), False, 0),
+            ('comment', missing, None, None),
+        ])
+        self.assertTrue(PostLike.objects.filter(author=self.liker, post=self.post).exists())
+        self.assertFalse(CommentLike.objects.filter(author=self.liker, comment=self.comment).exists())
+
+
+class ConcurrentLikeTests(TransactionTestCase):
+    # Every liker taps the like button from its own thread and connection at
+    # the same moment; an odd number of taps leaves the post liked.
+    likers = 12
+
+    def tap_concurrently(self):
+        users = create_users(*[f"tap-user-{i}" for i in range(self.likers)])
+        post = Post.objects.create(author=users[0], image='post_images/tap.jpg', caption='tap')
+        clients = [(api_client(user), 5 if i % 2 else 6) for i, user in enumerate(users)]
+        start = threading.Barrier(len(clients))
+        errors = []
+
+        def tap(client, taps):
+            try:
+                start.wait()
+                for _ in range(taps):
+                    response = client.post(f'/posts/{post.pk}/likes/like/')
+                    if response.status_code not in (200, 201):
+                        errors.append(response.status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap, args=client) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        like_counters.flush(wait=True)
+        post.refresh_from_db()
+        rows = PostLike.objects.filter(post=post).count()
+        self.assertEqual(rows, sum(taps % 2 for _, taps in clients))
+        self.assertEqual(post.likes_count, rows)
+
+    @override_settings(LIKE_COUNTER_WRITE_BEHIND=False)
+    def test_direct_counter(self):
+        self.tap_concurrently()
+
+    @override_settings(LIKE_COUNTER_WRITE_BEHIND=True)
+    def test_write_behind_counter(self):
+        self.tap_concurrently()
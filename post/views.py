@@ -1,29 +1,59 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from post.models import Post, Comment, PostLike, CommentLike
-from post.serializers import PostSerializer, CommentSerializer, PostLikeSerializer, CommentLikeSerializer
+from post.cache import render_posts, invalidate_post
+from post.feed import FeedPagination, schedule_fan_out
+from post.images import image_metadata, process_post_image
+from post.models import Post, Comment, PostLike, CommentLike, Timeline, build_comment_thread
+from post.serializers import PostSerializer, CommentSerializer, PostLikeSerializer, LikeBatchSerializer
 from shared.custom_pagination import CustomPagination
+from shared.models import UploadSession, POST_IMAGE
+from shared.storage import release_files
 
 
-class PostListView(generics.ListAPIView):
+class CachedPostListMixin:
+    # The page query only reads keys and the viewer's like flag; the posts
+    # themselves come from the per-post representation cache.
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        liked = {post.pk for post in page if post.me_liked}
+        return self.get_paginated_response(render_posts([post.pk for post in page], request, liked))
+
+
+class PostListView(CachedPostListMixin, generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, ]
     pagination_class = CustomPagination
 
     def get_queryset(self):
-        return Post.objects.all()
+        return Post.objects.only('id', 'create_time').with_me_liked(self.request.user)
 
 
-class PostUserListApiView(generics.ListAPIView):
+class PostUserListApiView(CachedPostListMixin, generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated, ]
     pagination_class = CustomPagination
 
     def get_queryset(self):
-        return Post.objects.filter(author=self.request.user)
+        return Post.objects.filter(author=self.request.user).only('id', 'create_time').with_me_liked(self.request.user)
+
+
+class PostFeedApiView(generics.ListAPIView):
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated, ]
+    pagination_class = FeedPagination
+
+    def get_queryset(self):
+        return Timeline.objects.filter(user=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        entries = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(render_posts([entry.post_id for entry in entries], request))
 
 
 class PostCreateApiView(generics.CreateAPIView):
@@ -31,7 +61,33 @@ class PostCreateApiView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, ]
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        # Atomic so the stored file's reference is rolled back with a failed insert.
+        with transaction.atomic():
+            post = serializer.save(author=self.request.user, **image_metadata(serializer.validated_data['image']))
+        transaction.on_commit(lambda: schedule_fan_out(post))
+        transaction.on_commit(lambda: process_post_image(post))
+
+
+class PostUploadFinalizeView(PostCreateApiView):
+    # Creates the post from a completed upload session; the assembled file is
+    # moved into storage rather than sent again as multipart.
+
+    def create(self, request, *args, **kwargs):
+        session = get_object_or_404(UploadSession.objects.active(), pk=self.kwargs['pk'],
+                                    user=self.request.user, target=POST_IMAGE)
+        image = session.assemble()
+        if image is None:
+            return Response({
+                'success': False,
+                'message': "Fayl to'liq yuklanmagan yoki checksum mos emas",
+                'offset': session.offset,
+            }, status=status.HTTP_400_BAD_REQUEST)
+        with image:
+            serializer = self.get_serializer(data={'caption': request.data.get('caption'), 'image': image})
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+        session.discard()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class PostRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
@@ -39,6 +95,9 @@ class PostRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly, ]
     queryset = Post.objects.all()
 
+    def get_queryset(self):
+        return Post.objects.with_stats(self.request.user)
+
     # def get_object(self):
     #     posts = Post.objects.filter(post__id=self.kwargs['pk'])
     #     return posts.first()
@@ -49,7 +108,13 @@ class PostRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
             if post.author == self.request.user:
                 serializer = PostSerializer(post, data=request.data)
                 serializer.is_valid(raise_exception=True)
-                serializer.save()
+                if 'image' in serializer.validated_data:
+                    replaced = [post.image.name, *[rendition['path'] for rendition in post.renditions.values()]]
+                    serializer.save(renditions={}, **image_metadata(serializer.validated_data['image']))
+                    release_files(*replaced)
+                    transaction.on_commit(lambda: process_post_image(post))
+                else:
+                    serializer.save()
                 data = {
                     'success': True,
                     'message': "Post o'zgartirildi!",
@@ -96,11 +161,36 @@ class PostRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
 class PostCommentApiListView(generics.ListAPIView):
     serializer_class = CommentSerializer
     permission_classes = [AllowAny, ]
+    pagination_class = CustomPagination
     queryset = Comment.objects.all()
+    max_reply_depth = 5
 
     def get_queryset(self):
         post_id = self.kwargs['pk']
-        return Comment.objects.filter(post__id=post_id)
+        return Comment.objects.filter(post__id=post_id, parent__isnull=True).with_stats(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        roots = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        replies = []
+        if roots:
+            replies = Comment.objects.descendants_of(roots).with_stats(self.request.user)
+        build_comment_thread(roots, list(replies), self.max_reply_depth)
+        serializer = self.get_serializer(roots, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class CommentReplyPagination(CustomPagination):
+    ordering = ('path', 'id')
+
+
+class CommentRepliesApiListView(generics.ListAPIView):
+    serializer_class = CommentSerializer
+    permission_classes = [AllowAny, ]
+    pagination_class = CommentReplyPagination
+
+    def get_queryset(self):
+        comment = get_object_or_404(Comment.objects.only('id', 'post_id', 'path'), pk=self.kwargs['pk'])
+        return Comment.objects.descendants_of([comment]).with_stats(self.request.user)
 
 
 class PostCommentCreateView(generics.CreateAPIView):
@@ -111,7 +201,8 @@ class PostCommentCreateView(generics.CreateAPIView):
         post_id = self.kwargs['pk']
         try:
             post = Post.objects.get(pk=post_id)
-            serializer.save(author=self.request.user, post=post)
+            with transaction.atomic():
+                serializer.save(author=self.request.user, post=post)
         except Post.DoesNotExist:
             return Response({
                 'success': False,
@@ -122,6 +213,7 @@ class PostCommentCreateView(generics.CreateAPIView):
 class PostLikesListApiViw(generics.ListAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly, ]
     serializer_class = PostLikeSerializer
+    pagination_class = CustomPagination
 
     def get_queryset(self):
         post_id = self.kwargs['pk']
@@ -130,30 +222,24 @@ class PostLikesListApiViw(generics.ListAPIView):
 
 class PostLikeCreateApiView(APIView):
     permission_classes = [IsAuthenticated, ]
-    serializer_class = PostLikeSerializer
 
     def post(self, request, *args, **kwargs):
         post_id = self.kwargs['pk']
         try:
-            like = PostLike.objects.get(post__id=post_id)
-            like.delete()
-            data = {
-                'success': True,
-                'message': 'Like o\'chirildi!',
-            }
-            return Response(data, status=status.HTTP_204_NO_CONTENT)
-        except PostLike.DoesNotExist:
-            post = Post.objects.get(pk=post_id)
-            like = PostLike.objects.create(author=self.request.user, post=post)
-            serializer = self.serializer_class(data=like)
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            data = {
-                'success': True,
-                'message': "Like bosildi!",
-                'data': serializer.data
-            }
-            return Response(data, status=status.HTTP_201_CREATED)
+            liked, likes_count = PostLike.objects.toggle(self.request.user.pk, post_id)
+        except Post.DoesNotExist:
+            return Response({
+                'success': False,
+                'message': "Post topilmadi!",
+            }, status=status.HTTP_404_NOT_FOUND)
+        invalidate_post(post_id)
+        data = {
+            'success': True,
+            'message': "Like bosildi!" if liked else 'Like o\'chirildi!',
+            'liked': liked,
+            'likes_count': likes_count,
+        }
+        return Response(data, status=status.HTTP_201_CREATED if liked else status.HTTP_200_OK)
 
 
 class CommentLikeCreateApiView(APIView):
@@ -162,20 +248,57 @@ class CommentLikeCreateApiView(APIView):
     def post(self, request, *args, **kwargs):
         comment_id = self.kwargs['pk']
         try:
-            comment_like = CommentLike.objects.get(comment__id=comment_id)
-            comment_like.delete()
-            data = {
-                'success': True,
-                'message': 'Comment like o\'chirildi!',
-            }
-            return Response(data, status=status.HTTP_204_NO_CONTENT)
-        except CommentLike.DoesNotExist:
-            comment = Comment.objects.get(pk=comment_id)
-            comment_like = CommentLike.objects.create(author=self.request.user, comment=comment)
-            serializer = CommentLikeSerializer(comment_like)
-            data = {
-                'success': True,
-                'message': "Commentga like bosildi!",
-                'data': serializer.data
-            }
-            return Response(data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+            liked, likes_count = CommentLike.objects.toggle(self.request.user.pk, comment_id)
+        except Comment.DoesNotExist:
+            return Response({
+                'success': False,
+                'message': "Comment topilmadi!",
+            }, status=status.HTTP_404_NOT_FOUND)
+        data = {
+            'success': True,
+            'message': "Commentga like bosildi!" if liked else 'Comment like o\'chirildi!',
+            'liked': liked,
+            'likes_count': likes_count,
+        }
+        return Response(data, status=status.HTTP_201_CREATED if liked else status.HTTP_200_OK)
+
+
+class LikeBatchApiView(APIView):
+    permission_classes = [IsAuthenticated, ]
+    serializer_class = LikeBatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+
+        # Queued taps can repeat a target; the last one is the one that counts.
+        wanted = {'post': {}, 'comment': {}}
+        for operation in operations:
+            wanted[operation['type']][operation['id']] = operation['like']
+
+        counts = {}
+        for target, manager in (('post', PostLike.objects), ('comment', CommentLike.objects)):
+            if not wanted[target]:
+                continue
+            like_ids = [pk for pk, like in wanted[target].items() if like]
+            unlike_ids = [pk for pk, like in wanted[target].items() if not like]
+            counts[target] = manager.bulk_set(self.request.user.pk, like_ids, unlike_ids)
+        if wanted['post']:
+            invalidate_post(*wanted['post'])
+
+        data = []
+        for target, items in wanted.items():
+            for pk, like in items.items():
+                found = pk in counts[target]
+                data.append({
+                    'type': target,
+                    'id': pk,
+                    'liked': like if found else None,
+                    'likes_count': counts[target][pk] if found else None,
+                })
+        return Response({
+            'success': True,
+            'message': "Like'lar saqlandi!",
+            'data': data,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db import connections
+
+
+class ExactCount:
+    exact = True
+
+    def count(self, queryset):
+        return queryset.count(), True
+
+
+class CachedCount(ExactCount):
+    timeout = 30
+    key_prefix = 'count'
+
+    def count(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(f"{queryset.db}:{sql}:{params!r}".encode('utf-8')).hexdigest()
+        key = f"{self.key_prefix}:{digest}"
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.set(key, total, self.timeout)
+        return total, True
+
+
+class EstimatedCount(CachedCount):
+    # Below this many rows the planner estimate is too rough to show and an
+    # exact COUNT is cheap anyway.
+    min_estimate = 10000
+
+    def count(self, queryset):
+        if queryset.query.where or queryset.query.distinct or queryset.query.is_sliced:
+            return super(EstimatedCount, self).count(queryset)
+        estimate = self.estimate(queryset)
+        if estimate is None or estimate < self.min_estimate:
+            return super(EstimatedCount, self).count(queryset)
+        return estimate, False
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been vacuumed or analyzed.
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
@@ -1,16 +1,145 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+from shared.count_strategy import EstimatedCount
 
 
-class CustomPagination(PageNumberPagination):
+class CustomPagination(BasePagination):
+    # Keyset pagination on `ordering` (by default (create_time, id), newest
+    # first): the cursor holds the boundary row, so deep pages cost the same as
+    # the first one. `size` is only computed for `?count=true`, through
+    # `count_class`; `size_exact` says whether it is a real count or a planner
+    # estimate.
     page_size = 10
-    page_query_param = 'page_size'
+    page_size_query_param = 'page_size'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = "Cursor xato"
+    count_class = EstimatedCount
+    ordering = ('-create_time', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        if self.wants_size(request):
+            self.size, self.size_exact = self.count_class().count(queryset)
+        else:
+            self.size, self.size_exact = None, None
+
+        reverse = cursor is not None and cursor[1]
+        values = None if cursor is None else self.clean_cursor(queryset.model, cursor[0])
+        results = self.fetch(queryset, values, reverse, page_size + 1)
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+        self.page = results
+        return results
+
+    def fetch(self, queryset, values, reverse, limit):
+        queryset = queryset.order_by(*self.get_ordering(reverse))
+        if values is not None:
+            queryset = self.after(queryset, values, reverse)
+        return list(queryset[:limit])
+
+    def get_ordering(self, reverse, ordering=None):
+        ordering = ordering or self.ordering
+        if not reverse:
+            return ordering
+        return [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+
+    def after(self, queryset, values, reverse, ordering=None):
+        # Rows strictly after (values) in the current ordering. The key is a pair:
+        # a range on the first column plus an exclude for ties, which PostgreSQL
+        # turns into one index range scan.
+        (first, second), (first_value, second_value) = self.get_ordering(reverse, ordering), values
+        if first.startswith('-'):
+            first, second = first[1:], second.lstrip('-')
+            return queryset.filter(**{f'{first}__lte': first_value}).exclude(
+                **{first: first_value, f'{second}__gte': second_value})
+        second = second.lstrip('-')
+        return queryset.filter(**{f'{first}__gte': first_value}).exclude(
+            **{first: first_value, f'{second}__lte': second_value})
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def wants_size(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = [str(value) for value in data['v']]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return values, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def clean_cursor(self, model, values):
+        try:
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, obj, reverse):
+        values = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        data = {'v': [value.isoformat() if isinstance(value, datetime) else str(value) for value in values]}
+        if reverse:
+            data['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
 
     def get_paginated_response(self, data):
         return Response({
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
-            'size': self.page.paginator.count,
+            'size': self.size,
+            'size_exact': self.size_exact,
             'data': data,
         })
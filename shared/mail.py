@@ -0,0 +1,165 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import connection as db_connection
+
+SENDER_WORKERS = getattr(settings, 'EMAIL_SENDER_WORKERS', 2)
+QUEUE_SIZE = getattr(settings, 'EMAIL_QUEUE_SIZE', 1000)
+BATCH_SIZE = getattr(settings, 'EMAIL_BATCH_SIZE', 50)
+QUEUE_TIMEOUT = getattr(settings, 'EMAIL_QUEUE_TIMEOUT', 2)
+IDLE_TIMEOUT = getattr(settings, 'EMAIL_IDLE_TIMEOUT', 30)
+
+logger = logging.getLogger(__name__)
+
+
+class EmailSender:
+    # A fixed pool of worker threads behind a bounded queue. Each worker keeps
+    # one backend connection open (one TLS handshake, not one per message),
+    # drains whatever is queued up to BATCH_SIZE into a single send_messages()
+    # call, and closes the connection after IDLE_TIMEOUT seconds without work.
+    # Counters are per process; stats() is logged by the outbox worker and
+    # printed by drain_email_outbox.
+    # submit() blocks for at most QUEUE_TIMEOUT seconds when the queue is full
+    # and then raises queue.Full, so a burst slows callers down instead of
+    # growing memory without bound.
+
+    def __init__(self, workers=SENDER_WORKERS, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 queue_timeout=QUEUE_TIMEOUT, idle_timeout=IDLE_TIMEOUT):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue_timeout = queue_timeout
+        self.idle_timeout = idle_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.threads = []
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=1000)
+
+    def submit(self, message, callback=None):
+        # callback(error) runs on the worker thread once the message is
+        # delivered (error None) or given up on.
+        self.start()
+        self.queue.put((time.monotonic(), message, callback), timeout=self.queue_timeout)
+
+    def capacity(self):
+        return self.queue.maxsize - self.queue.qsize()
+
+    def start(self):
+        if len(self.threads) >= self.workers:
+            return
+        with self.lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.run, name=f'email-sender-{len(self.threads)}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def run(self):
+        connection = None
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                if connection is not None:
+                    self.close_connection(connection)
+                    connection = None
+                # Delivery callbacks may have opened one on this thread.
+                db_connection.close()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                connection = self.deliver(connection, batch)
+            except Exception:
+                logger.exception("Email batch delivery failed")
+                connection = None
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def deliver(self, connection, batch):
+        messages = [message for _, message, _ in batch]
+        try:
+            connection = connection or self.open_connection()
+            connection.send_messages(messages)
+            errors = [None] * len(messages)
+        except Exception:
+            # Usually the server dropped an idle connection, sometimes one bad
+            # recipient aborted the batch: reconnect and send one by one.
+            logger.warning("Email batch of %s failed, retrying one by one", len(messages), exc_info=True)
+            self.close_connection(connection)
+            connection = None
+            errors = []
+            for message in messages:
+                try:
+                    connection = connection or self.open_connection()
+                    connection.send_messages([message])
+                    errors.append(None)
+                except Exception as error:
+                    logger.exception("Email to %s failed", message.to)
+                    errors.append(error)
+                    self.close_connection(connection)
+                    connection = None
+        done = time.monotonic()
+        with self.lock:
+            self.failed += sum(error is not None for error in errors)
+            self.sent += len(errors) - sum(error is not None for error in errors)
+            self.batches += 1
+            self.latencies.extend(done - queued for queued, _, _ in batch)
+        for (_, _, callback), error in zip(batch, errors):
+            if callback is not None:
+                try:
+                    callback(error)
+                except Exception:
+                    logger.exception("Email delivery callback failed")
+        return connection
+
+    @staticmethod
+    def open_connection():
+        connection = get_connection(fail_silently=False)
+        # Opened explicitly so send_messages() does not close it afterwards.
+        connection.open()
+        return connection
+
+    @staticmethod
+    def close_connection(connection):
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            stats = {
+                'queued': self.queue.qsize(),
+                'workers': sum(thread.is_alive() for thread in self.threads),
+                'sent': self.sent,
+                'failed': self.failed,
+                'batches': self.batches,
+            }
+        stats['latency_avg_ms'] = round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None
+        stats['latency_p95_ms'] = round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None
+        return stats
+
+    def close(self, timeout=5):
+        # Gives queued messages a chance to go out before the process exits.
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+
+email_sender = EmailSender()
+atexit.register(email_sender.close)
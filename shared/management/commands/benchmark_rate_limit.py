@@ -0,0 +1,52 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from shared import throttling
+
+
+class BenchmarkView:
+    throttle_scope = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = "Measure the per-request cost of RateLimitThrottle on the shared cache and the local fallback"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50000)
+        parser.add_argument('--clients', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count, clients = options['requests'], options['clients']
+        factory = APIRequestFactory()
+        run = uuid.uuid4().hex[:8]
+        requests = []
+        for i in range(clients):
+            request = Request(factory.post('/users/login/', {'userinput': f"{run}-{i}", 'password': 'x'}, format='json',
+                                           REMOTE_ADDR=f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"),
+                              parsers=[JSONParser()])
+            request.data
+            requests.append(request)
+        view = BenchmarkView()
+        throttling.RATES['benchmark'] = {'ip': (10 ** 9, 60), 'identifier': (10 ** 9, 60)}
+        shared_caches = throttling.caches
+        try:
+            self.measure('baseline', count, lambda i: None)
+            throttle = throttling.RateLimitThrottle()
+            self.measure('shared cache', count, lambda i: throttle.allow_request(requests[i % clients], view))
+            throttling.caches = {throttling.RATE_LIMIT_CACHE: throttling._fallback}
+            self.measure('local fallback', count, lambda i: throttle.allow_request(requests[i % clients], view))
+        finally:
+            throttling.caches = shared_caches
+            del throttling.RATES['benchmark']
+
+    def measure(self, label, count, call):
+        started = time.perf_counter()
+        for i in range(count):
+            call(i)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label}: {elapsed / count * 1e6:.1f} us/so'rov, {count / elapsed:.0f}/s")
@@ -0,0 +1,26 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from shared.models import UploadSession
+from shared.uploads import UPLOAD_DIR, UPLOAD_TTL
+
+
+class Command(BaseCommand):
+    help = "Delete expired upload sessions and leftover part files"
+
+    def handle(self, *args, **options):
+        sessions = 0
+        for session in UploadSession.objects.expired().iterator():
+            session.discard()
+            sessions += 1
+        # Part files whose session row is already gone (e.g. the user was deleted).
+        files = 0
+        cutoff = time.time() - UPLOAD_TTL.total_seconds()
+        if os.path.isdir(UPLOAD_DIR):
+            for entry in os.scandir(UPLOAD_DIR):
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    files += 1
+        self.stdout.write(f"{sessions} ta sessiya, {files} ta fayl o'chirildi")
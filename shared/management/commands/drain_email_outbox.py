@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shared.mail import email_sender
+from shared.models import EmailOutbox
+from shared.outbox import POLL_INTERVAL, drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver pending emails from the outbox; safe to run on several hosts at once"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when nothing is due")
+        parser.add_argument('--purge-days', type=int, default=7, help="Delete sent emails older than this")
+        parser.add_argument('--stats-interval', type=int, default=60,
+                            help="Print the sender pool's stats every this many seconds")
+
+    def handle(self, *args, **options):
+        purged, _ = EmailOutbox.objects.filter(
+            sent_at__lt=timezone.now() - timedelta(days=options['purge_days'])).delete()
+        self.stdout.write(f"{purged} ta eski xat o'chirildi")
+        logged = time.monotonic()
+        try:
+            while True:
+                if time.monotonic() - logged >= options['stats_interval']:
+                    logged = time.monotonic()
+                    self.write_stats()
+                claimed = drain_outbox()
+                if claimed:
+                    self.stdout.write(f"{claimed} ta xat yuborishga olindi")
+                    continue
+                if options['once']:
+                    break
+                time.sleep(POLL_INTERVAL)
+        finally:
+            email_sender.close(timeout=30)
+        self.write_stats()
+
+    def write_stats(self):
+        stats = email_sender.stats()
+        self.stdout.write(' '.join(f"{key}={value}" for key, value in stats.items()))
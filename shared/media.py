@@ -0,0 +1,136 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse, Http404
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+
+MEDIA_REQUIRE_AUTH = getattr(settings, 'MEDIA_REQUIRE_AUTH', False)
+# Dotted paths of DRF permission classes; has_object_permission(request, view,
+# name) gets the file's name under MEDIA_ROOT. None by default, so any file is
+# readable by whoever MEDIA_REQUIRE_AUTH lets in.
+MEDIA_PERMISSION_CLASSES = tuple(getattr(settings, 'MEDIA_PERMISSION_CLASSES', ()))
+MEDIA_PREFIXES = tuple(getattr(settings, 'MEDIA_SERVE_PREFIXES', ('post_images/', 'users_photos/')))
+# None (serve from Python), 'nginx' (X-Accel-Redirect) or 'sendfile' (X-Sendfile).
+MEDIA_ACCEL = getattr(settings, 'MEDIA_ACCEL', None)
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+LEGACY_CACHE = 'public, max-age=86400'
+READ_SIZE = 64 * 1024
+CONTENT_HASH = re.compile(r'(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.[0-9a-z]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_path(name):
+    # Only files under the upload directories, never dotfiles such as the
+    # storage's .incoming-* temporaries.
+    if not name.startswith(MEDIA_PREFIXES) or any(part.startswith('.') for part in name.split('/')):
+        raise Http404
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+    return path
+
+
+def media_validators(name, stat):
+    # Content-addressed names carry the sha256 of the bytes, which is both a
+    # strong ETag and a guarantee that the URL never changes content.
+    match = CONTENT_HASH.search(name)
+    if match:
+        return f'"{match.group(3)}"', IMMUTABLE_CACHE
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"', LEGACY_CACHE
+
+
+def etag_matches(header, etag):
+    # If-None-Match uses the weak comparison: W/"x" matches "x".
+    if not header:
+        return False
+    tags = parse_etags(header)
+    if tags == ['*']:
+        return True
+    return weak_etag(etag) in {weak_etag(tag) for tag in tags}
+
+
+def weak_etag(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def parse_range(header, size):
+    # Single byte range only; anything else is served whole, as RFC 9110 allows.
+    # Returns (start, end) inclusive, None for a full response, or False when
+    # the range cannot be satisfied.
+    match = RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(READ_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_media(request, name, private=False):
+    # `private` keeps shared caches from handing a restricted file to others.
+    path = media_path(name)
+    stat = os.stat(path)
+    etag, cache_control = media_validators(name, stat)
+    if private:
+        cache_control = cache_control.replace('public', 'private')
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return HttpResponse(status=304, headers=headers)
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if MEDIA_ACCEL == 'nginx':
+        # nginx serves the bytes (and Range) from an `internal` location
+        # aliased to MEDIA_ROOT at MEDIA_ACCEL_PREFIX.
+        headers['X-Accel-Redirect'] = quote(MEDIA_ACCEL_PREFIX + name)
+        return HttpResponse(content_type=content_type, headers=headers)
+    if MEDIA_ACCEL == 'sendfile':
+        headers['X-Sendfile'] = path
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    byte_range = None
+    if request.method == 'GET' and (not request.headers.get('If-Range') or request.headers['If-Range'] == etag):
+        byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+    if byte_range is False:
+        headers['Content-Range'] = f'bytes */{stat.st_size}'
+        return HttpResponse(status=416, headers=headers)
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), content_type=content_type, headers=headers)
+    start, end = byte_range
+    headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    headers['Content-Length'] = str(end - start + 1)
+    return StreamingHttpResponse(read_range(path, start, end - start + 1), status=206,
+                                 content_type=content_type, headers=headers)
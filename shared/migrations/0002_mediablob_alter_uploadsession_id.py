@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:54
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shared', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.UUID('88a3f40f-3e15-4f67-bb97-46970d27fa9f'), primary_key=True, serialize=False)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'media_blobs',
+            },
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('88a3f40f-3e15-4f67-bb97-46970d27fa9f'), primary_key=True, serialize=False),
+        ),
+    ]
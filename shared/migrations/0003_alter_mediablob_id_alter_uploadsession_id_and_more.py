@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:58
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shared', '0002_mediablob_alter_uploadsession_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediablob',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('ee078003-fef0-43ed-980b-384878ffbda3'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='uploadsession',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('ee078003-fef0-43ed-980b-384878ffbda3'), primary_key=True, serialize=False),
+        ),
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.UUIDField(default=uuid.UUID('ee078003-fef0-43ed-980b-384878ffbda3'), primary_key=True, serialize=False)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('dedupe_key', models.CharField(max_length=255, unique=True)),
+                ('to_email', models.CharField(max_length=255)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('content_type', models.CharField(default='plain', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'db_table': 'email_outbox',
+                'indexes': [models.Index(condition=models.Q(('sent_at__isnull', True)), fields=['next_attempt_at'], name='email_outbox_pending_idx')],
+            },
+        ),
+    ]
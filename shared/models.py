@@ -1,14 +1,185 @@
+import os
 import uuid
 
-from django.db import models
+from django.db import models, connection, transaction
+from django.utils import timezone
+
+from shared.uploads import UPLOAD_DIR, UPLOAD_TTL, SessionFile, file_sha256
 
 # Create your models here.
 
 
 class BaseModel(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4())
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     create_time = models.DateTimeField(auto_now_add=True)
     update_time = models.DateTimeField(auto_now=True)
 
     class Meta:
         abstract = True
+
+
+POST_IMAGE, USER_PHOTO = 'post_image', 'user_photo'
+
+
+class UploadSessionQuerySet(models.QuerySet):
+
+    def active(self):
+        return self.filter(create_time__gte=timezone.now() - UPLOAD_TTL)
+
+    def expired(self):
+        return self.filter(create_time__lt=timezone.now() - UPLOAD_TTL)
+
+
+class UploadSession(BaseModel):
+    TARGETS = (
+        (POST_IMAGE, POST_IMAGE),
+        (USER_PHOTO, USER_PHOTO),
+    )
+    user = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='upload_sessions')
+    target = models.CharField(max_length=13, choices=TARGETS)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    checksum = models.CharField(max_length=64)
+
+    objects = UploadSessionQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'upload_sessions'
+
+    def __str__(self):
+        return f"{self.user} - {self.filename}"
+
+    @property
+    def path(self):
+        return os.path.join(UPLOAD_DIR, f'{self.pk}.part')
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def assemble(self):
+        # None until every byte is in and the sha256 matches; a complete file
+        # with the wrong hash is corrupt somewhere, so it is dropped for a retry.
+        if self.offset != self.size:
+            return None
+        if file_sha256(self.path) != self.checksum:
+            os.truncate(self.path, 0)
+            return None
+        return SessionFile(self.path, self.filename)
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.delete()
+
+
+class MediaBlobManager(models.Manager):
+
+    def acquire(self, name, size):
+        # One more reference to `name`; the row lock taken here is held until
+        # the caller's transaction ends, which orders it against release().
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (id, create_time, update_time, name, size, refcount) "
+                f"VALUES (%s, now(), now(), %s, %s, 1) "
+                f"ON CONFLICT (name) DO UPDATE SET refcount = {table}.refcount + 1, update_time = now() "
+                f"RETURNING refcount",
+                [uuid.uuid4(), name, size],
+            )
+            return cursor.fetchone()[0]
+
+    def release(self, name):
+        # True once nothing references `name` any more. Files stored before
+        # deduplication have no row and a single owner.
+        with transaction.atomic():
+            blob = self.select_for_update().filter(name=name).first()
+            if blob is None:
+                return True
+            if blob.refcount > 1:
+                self.filter(pk=blob.pk).update(refcount=models.F('refcount') - 1)
+                return False
+            blob.delete()
+            return True
+
+
+class MediaBlob(BaseModel):
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=1)
+
+    objects = MediaBlobManager()
+
+    class Meta:
+        db_table = 'media_blobs'
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
+class EmailOutboxManager(models.Manager):
+
+    def enqueue(self, dedupe_key, to_email, subject, body, content_type, window):
+        # Joins the caller's transaction, so the email exists exactly when the
+        # state it announces (e.g. a UserConfirmation code) does. A repeat of
+        # the same key inside `window` is dropped; later it is sent again.
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (id, create_time, update_time, dedupe_key, to_email, subject, body, "
+                f"content_type, attempts, next_attempt_at, sent_at, last_error) "
+                f"VALUES (%s, now(), now(), %s, %s, %s, %s, %s, 0, now(), NULL, '') "
+                f"ON CONFLICT (dedupe_key) DO UPDATE SET create_time = now(), update_time = now(), "
+                f"to_email = EXCLUDED.to_email, subject = EXCLUDED.subject, body = EXCLUDED.body, "
+                f"content_type = EXCLUDED.content_type, attempts = 0, next_attempt_at = now(), "
+                f"sent_at = NULL, last_error = '' "
+                f"WHERE {table}.create_time < now() - %s",
+                [uuid.uuid4(), dedupe_key, to_email, subject, body, content_type, window],
+            )
+
+    def claim(self, limit, max_attempts, backoff, max_backoff):
+        # SKIP LOCKED lets any number of drainers share the table. Claiming
+        # pushes next_attempt_at out by the backoff for this attempt, which is
+        # both the retry delay and the lease: a drainer that dies mid-send
+        # leaves the row to be picked up again after it.
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET attempts = attempts + 1, update_time = now(), "
+                f"next_attempt_at = now() + LEAST(%s * power(2, attempts), %s) * interval '1 second' "
+                f"WHERE id IN ("
+                f"SELECT id FROM {table} WHERE sent_at IS NULL AND attempts < %s AND next_attempt_at <= now() "
+                f"ORDER BY next_attempt_at LIMIT %s FOR UPDATE SKIP LOCKED"
+                f") RETURNING id, to_email, subject, body, content_type",
+                [backoff, max_backoff, max_attempts, limit],
+            )
+            return cursor.fetchall()
+
+
+class EmailOutbox(BaseModel):
+    dedupe_key = models.CharField(max_length=255, unique=True)
+    to_email = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    content_type = models.CharField(max_length=10, default='plain')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+
+    objects = EmailOutboxManager()
+
+    class Meta:
+        db_table = 'email_outbox'
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='email_outbox_pending_idx',
+                         condition=models.Q(sent_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} - {self.subject}"
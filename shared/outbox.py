@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction, close_old_connections
+from django.utils import timezone
+
+from shared.mail import email_sender
+from shared.models import EmailOutbox
+
+POLL_INTERVAL = getattr(settings, 'EMAIL_OUTBOX_POLL_INTERVAL', 10)
+BATCH_SIZE = getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100)
+MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+BACKOFF = getattr(settings, 'EMAIL_OUTBOX_BACKOFF', 60)
+MAX_BACKOFF = getattr(settings, 'EMAIL_OUTBOX_MAX_BACKOFF', 60 * 60)
+DEDUPE_WINDOW = timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_DEDUPE_WINDOW', 10 * 60))
+STATS_INTERVAL = getattr(settings, 'EMAIL_SENDER_STATS_INTERVAL', 5 * 60)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(to_email, subject, body, content_type='plain', dedupe_key=None):
+    EmailOutbox.objects.enqueue(dedupe_key or uuid.uuid4().hex, to_email, subject, body, content_type,
+                                DEDUPE_WINDOW)
+    transaction.on_commit(outbox_worker.wake)
+
+
+def mark_delivered(pk):
+    def callback(error):
+        if error is None:
+            EmailOutbox.objects.filter(pk=pk).update(sent_at=timezone.now(), last_error='')
+        else:
+            EmailOutbox.objects.filter(pk=pk).update(last_error=repr(error)[:1000])
+    return callback
+
+
+def drain_outbox(limit=BATCH_SIZE):
+    # Claims what the sender pool has room for and hands it over; rows are
+    # marked sent from the pool's delivery callbacks.
+    limit = min(limit, email_sender.capacity())
+    if limit <= 0:
+        return 0
+    rows = EmailOutbox.objects.claim(limit, MAX_ATTEMPTS, BACKOFF, MAX_BACKOFF)
+    for pk, to_email, subject, body, content_type in rows:
+        message = EmailMessage(subject=subject, body=body, to=[to_email])
+        if content_type == 'html':
+            message.content_subtype = 'html'
+        email_sender.submit(message, mark_delivered(pk))
+    return len(rows)
+
+
+class OutboxWorker:
+    # One daemon thread per process, started by the first enqueue: drains
+    # right after commits and polls every POLL_INTERVAL for retries. Extra
+    # drainers can run as `manage.py drain_email_outbox`. The sender pool's
+    # stats are logged every STATS_INTERVAL seconds.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def wake(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='email-outbox', daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def run(self):
+        logged = time.monotonic()
+        while True:
+            self.wakeup.wait(POLL_INTERVAL)
+            self.wakeup.clear()
+            try:
+                close_old_connections()
+                while drain_outbox() == BATCH_SIZE:
+                    pass
+            except Exception:
+                logger.exception("Email outbox drain failed, retrying next poll")
+            if time.monotonic() - logged >= STATS_INTERVAL:
+                logged = time.monotonic()
+                logger.info("Email sender stats: %s", email_sender.stats())
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,60 @@
+import os
+import re
+
+from django.apps import apps
+from django.core.validators import FileExtensionValidator
+from rest_framework import serializers
+
+from shared.models import UploadSession, POST_IMAGE, USER_PHOTO
+from shared.uploads import UPLOAD_MAX_SIZE
+
+# The field each target ends up in; its FileExtensionValidator decides which
+# files a session may be opened for.
+TARGET_FIELDS = {
+    POST_IMAGE: ('post.Post', 'image'),
+    USER_PHOTO: ('users.User', 'photo'),
+}
+
+
+def allowed_extensions(target):
+    model, field = TARGET_FIELDS[target]
+    for validator in apps.get_model(model)._meta.get_field(field).validators:
+        if isinstance(validator, FileExtensionValidator):
+            return validator.allowed_extensions
+    return None
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(read_only=True)
+    offset = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'target', 'filename', 'size', 'checksum', 'offset']
+
+    def validate_filename(self, filename):
+        # Only the name: a client-sent directory must not reach the storage path.
+        filename = os.path.basename(filename.replace('\\', '/')).strip()
+        if not filename or filename.startswith('.'):
+            raise serializers.ValidationError("Fayl nomi xato")
+        return filename
+
+    def validate(self, data):
+        extensions = allowed_extensions(data['target'])
+        extension = os.path.splitext(data['filename'])[1][1:].lower()
+        if extensions is not None and extension not in extensions:
+            raise serializers.ValidationError({
+                'filename': f"Ruxsat etilgan fayl turlari: {', '.join(extensions)}"
+            })
+        return data
+
+    def validate_size(self, size):
+        if not 0 < size <= UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"Fayl hajmi 1 va {UPLOAD_MAX_SIZE} bayt oralig'ida bo'lishi kerak")
+        return size
+
+    def validate_checksum(self, checksum):
+        checksum = checksum.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', checksum):
+            raise serializers.ValidationError("Checksum sha256 hex ko'rinishida bo'lishi kerak")
+        return checksum
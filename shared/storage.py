@@ -0,0 +1,78 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+from shared.models import MediaBlob
+
+READ_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Files are named by the sha256 of their bytes inside the upload_to
+    # directory, sharded two levels deep (post_images/ab/cd/abcd...jpg), so
+    # identical uploads share one file. MediaBlob counts the references:
+    # every save adds one, delete() only removes the file with the last one.
+
+    def get_available_name(self, name, max_length=None):
+        # The final name depends on the content and is chosen in _save.
+        return name
+
+    def _save(self, name, content):
+        directory, extension = posixpath.dirname(name), os.path.splitext(name)[1].lower()
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large upload, upload session): hash it in place
+            # and move it, never copy.
+            source, temporary = content.temporary_file_path(), False
+            with open(source, 'rb') as file:
+                while chunk := file.read(READ_SIZE):
+                    digest.update(chunk)
+                    size += len(chunk)
+        else:
+            os.makedirs(self.location, exist_ok=True)
+            fd, source = tempfile.mkstemp(dir=self.location, prefix='.incoming-')
+            temporary = True
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+
+        blob = digest.hexdigest()
+        name = posixpath.join(directory, blob[:2], blob[2:4], blob + extension)
+        full_path = self.path(name)
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.acquire(name, size)
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    file_move_safe(source, full_path, allow_overwrite=True)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+        finally:
+            if temporary and os.path.exists(source):
+                os.remove(source)
+        return name
+
+    def delete(self, name):
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        with transaction.atomic():
+            if MediaBlob.objects.release(name):
+                super(ContentAddressedStorage, self).delete(name)
+
+
+def release_files(*names):
+    # Drops one reference per name after the current transaction commits, so a
+    # rollback never leaves a row pointing at a removed file.
+    from django.core.files.storage import default_storage
+
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: [default_storage.delete(name) for name in names])
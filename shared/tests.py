@@ -1,3 +1,495 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import BasePermission
+from rest_framework.request import Request
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+
+from post.models import Post
+from shared import media, outbox, storage, throttling, views
+from shared.count_strategy import CachedCount, EstimatedCount, ExactCount
+from shared.custom_pagination import CustomPagination
+from shared.mail import EmailSender
+from shared.models import EmailOutbox, MediaBlob, UploadSession, POST_IMAGE, USER_PHOTO
+from shared.storage import ContentAddressedStorage
+from users.models import User
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: no TLS, no auth, every message accepted
+    # unless the server is told to refuse senders.
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            server.open_sockets.append(self.connection)
+        self.reply('220 stand-in ESMTP')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 stand-in')
+            elif command == 'MAIL':
+                self.reply('451 try again later' if server.refuse else '250 OK')
+            elif command in ('RCPT', 'RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 end with .')
+                data = []
+                for line in iter(self.rfile.readline, b''):
+                    if line.rstrip(b'\r\n') == b'.':
+                        break
+                    data.append(line)
+                with server.lock:
+                    server.messages.append(b''.join(data))
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b'\r\n')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super(SMTPStandIn, self).__init__(('127.0.0.1', 0), SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.open_sockets = []
+        self.messages = []
+        self.refuse = False
+
+    def drop_connections(self):
+        # What a server closing idle clients looks like from smtplib's side.
+        with self.lock:
+            sockets, self.open_sockets = self.open_sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class SMTPStandInMixin:
+
+    def setUp(self):
+        super(SMTPStandInMixin, self).setUp()
+        self.smtp = SMTPStandIn()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+        self.sender = EmailSender(workers=1, idle_timeout=0.2)
+
+    def send(self, count, errors):
+        for i in range(count):
+            self.sender.submit(EmailMessage(subject=f"xat {i}", body='salom', to=[f"user{i}@example.com"]),
+                               errors.append)
+        self.wait_sent()
+
+    def wait_sent(self):
+        self.sender.close(timeout=10)
+        self.assertEqual(self.sender.queue.unfinished_tasks, 0)
+
+
+class EmailSenderTests(SMTPStandInMixin, TestCase):
+
+    def test_pooled_connection_is_reused(self):
+        errors = []
+        self.send(10, errors)
+        self.send(5, errors)
+        self.assertEqual(errors, [None] * 15)
+        self.assertEqual(len(self.smtp.messages), 15)
+        self.assertEqual(self.smtp.connections, 1)
+        stats = self.sender.stats()
+        self.assertEqual((stats['sent'], stats['failed'], stats['workers']), (15, 0, 1))
+        self.assertGreaterEqual(stats['batches'], 2)
+
+    def test_reconnects_after_dropped_connection(self):
+        errors = []
+        self.send(3, errors)
+        self.smtp.drop_connections()
+        with self.assertLogs('shared.mail', 'WARNING'):
+            self.send(3, errors)
+        self.assertEqual(errors, [None] * 6)
+        self.assertEqual(len(self.smtp.messages), 6)
+        self.assertEqual(self.smtp.connections, 2)
+        self.assertEqual(self.sender.stats()['failed'], 0)
+
+    def test_refused_message_reports_error(self):
+        errors = []
+        self.smtp.refuse = True
+        with self.assertLogs('shared.mail', 'ERROR'):
+            self.send(2, errors)
+        self.assertEqual(len(errors), 2)
+        self.assertTrue(all(error is not None for error in errors))
+        self.assertEqual(self.smtp.messages, [])
+        self.assertEqual(self.sender.stats()['failed'], 2)
+
+
+class EmailOutboxRetryTests(SMTPStandInMixin, TransactionTestCase):
+    # Delivery callbacks write from the sender's own thread and connection,
+    # so the rows have to be committed.
+
+    def setUp(self):
+        super(EmailOutboxRetryTests, self).setUp()
+        patcher = mock.patch.object(outbox, 'email_sender', self.sender)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_email_is_retried_after_backoff(self):
+        EmailOutbox.objects.enqueue('retry-test', 'user@example.com', 'Kod', '1234', 'plain', timedelta(minutes=10))
+        self.smtp.refuse = True
+        with self.assertLogs('shared.mail', 'ERROR'):
+            self.assertEqual(outbox.drain_outbox(), 1)
+            self.wait_sent()
+        email = EmailOutbox.objects.get(dedupe_key='retry-test')
+        self.assertIsNone(email.sent_at)
+        self.assertEqual(email.attempts, 1)
+        self.assertNotEqual(email.last_error, '')
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        # Still backing off.
+        self.assertEqual(outbox.drain_outbox(), 0)
+
+        self.smtp.refuse = False
+        EmailOutbox.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.drain_outbox(), 1)
+        self.wait_sent()
+        email.refresh_from_db()
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.last_error, '')
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(outbox.drain_outbox(), 0)
+
+    def test_gives_up_after_max_attempts(self):
+        EmailOutbox.objects.enqueue('give-up-test', 'user@example.com', 'Kod', '1234', 'plain', timedelta(minutes=10))
+        self.smtp.refuse = True
+        for _ in range(outbox.MAX_ATTEMPTS):
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            with self.assertLogs('shared.mail', 'ERROR'):
+                self.assertEqual(outbox.drain_outbox(), 1)
+                self.wait_sent()
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.drain_outbox(), 0)
+        self.assertEqual(EmailOutbox.objects.get().attempts, outbox.MAX_ATTEMPTS)
+
+
+class HidePrivateImages(BasePermission):
+
+    def has_object_permission(self, request, view, obj):
+        return not obj.startswith('post_images/private')
+
+
+class MediaTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        os.makedirs(os.path.join(media_root.name, 'post_images'))
+        for name in ('my photo.jpg', 'private.jpg'):
+            with open(os.path.join(media_root.name, 'post_images', name), 'wb') as file:
+                file.write(b'image bytes')
+        self.client = APIClient()
+
+    def test_etag_matches(self):
+        etag = '"abc"'
+        for header in ('"abc"', 'W/"abc"', '"x", W/"abc"', '"a,b" , "abc"', '*', ' * '):
+            with self.subTest(header=header):
+                self.assertTrue(media.etag_matches(header, etag))
+        for header in ('', '"abcd"', 'abc', '"x", "a,abc"', 'W/"ab"'):
+            with self.subTest(header=header):
+                self.assertFalse(media.etag_matches(header, etag))
+
+    def test_not_modified_for_weak_validator(self):
+        response = self.client.get('/media/post_images/private.jpg')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get('/media/post_images/private.jpg', HTTP_IF_NONE_MATCH=f'"other", W/{etag}')
+        self.assertEqual(response.status_code, 304)
+
+    def test_accel_redirect_is_quoted(self):
+        with mock.patch.object(media, 'MEDIA_ACCEL', 'nginx'):
+            response = self.client.get('/media/post_images/my%20photo.jpg')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/post_images/my%20photo.jpg')
+
+    def test_object_permission(self):
+        with mock.patch.object(views, 'MEDIA_PERMISSION_CLASSES', ('shared.tests.HidePrivateImages',)):
+            # Anonymous, so DRF answers 401 rather than 403.
+            self.assertEqual(self.client.get('/media/post_images/private.jpg').status_code, 401)
+            response = self.client.get('/media/post_images/my%20photo.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+
+
+class TemporaryMediaRootMixin:
+
+    def setUp(self):
+        super(TemporaryMediaRootMixin, self).setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = media_root.name
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+
+def png_bytes(size=(64, 48), color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class UploadSessionTests(TemporaryMediaRootMixin, TestCase):
+
+    def setUp(self):
+        super(UploadSessionTests, self).setUp()
+        self.user = User.objects.create(username='upload-user', password='pbkdf2_sha256$1$salt$hash',
+                                        auth_status='done')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user.token()['access'])
+        self.data = png_bytes()
+
+    def create_session(self, filename, target=POST_IMAGE, data=None):
+        data = self.data if data is None else data
+        return self.client.post('/uploads/', {
+            'target': target, 'filename': filename, 'size': len(data),
+            'checksum': hashlib.sha256(data).hexdigest(),
+        }, format='json')
+
+    def put_chunk(self, pk, offset, chunk):
+        return self.client.generic('PUT', f'/uploads/{pk}/', chunk, content_type='application/offset+octet-stream',
+                                   HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_filename_keeps_only_the_name(self):
+        response = self.create_session('../../etc/cron.d/photo.PNG')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['filename'], 'photo.PNG')
+        response = self.create_session('C:\\Users\\ali\\photo.png')
+        self.assertEqual(response.data['filename'], 'photo.png')
+        self.assertEqual(self.create_session('../.hidden').status_code, 400)
+
+    def test_extension_checked_per_target(self):
+        self.assertEqual(self.create_session('clip.mp4').status_code, 400)
+        self.assertEqual(self.create_session('photo.heic').status_code, 400)
+        self.assertEqual(self.create_session('photo.heic', target=USER_PHOTO).status_code, 201)
+        self.assertEqual(UploadSession.objects.count(), 1)
+
+    def test_chunked_upload_and_finalize(self):
+        response = self.create_session('nested/dir/photo.png')
+        self.assertEqual(response.status_code, 201)
+        pk, middle = response.data['id'], len(self.data) // 2
+        self.addCleanup(UploadSession.objects.get(pk=pk).discard)
+
+        self.assertEqual(self.put_chunk(pk, 0, self.data[:middle]).data['offset'], middle)
+        response = self.put_chunk(pk, 0, self.data[middle:])
+        self.assertEqual((response.status_code, response.data['offset']), (409, middle))
+        # Finalizing early reports where to resume.
+        response = self.client.post(f'/posts/uploads/{pk}/finalize/', {'caption': 'salom'}, format='json')
+        self.assertEqual((response.status_code, response.data['offset']), (400, middle))
+        self.assertEqual(self.client.get(f'/uploads/{pk}/').data['offset'], middle)
+
+        self.assertEqual(self.put_chunk(pk, middle, self.data[middle:]).data['offset'], len(self.data))
+        response = self.client.post(f'/posts/uploads/{pk}/finalize/', {'caption': 'salom'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(author=self.user)
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(post.image.name, f'post_images/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        with open(os.path.join(self.media_root, post.image.name), 'rb') as file:
+            self.assertEqual(file.read(), self.data)
+        self.assertEqual((post.image_width, post.image_height), (64, 48))
+
+
+class CursorPaginationTests(TestCase):
+    # Five of the eight posts share a create_time, so pages have to split a
+    # run of equal timestamps on the id.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='cursor-author', password='!')
+        Post.objects.bulk_create([
+            Post(author=cls.author, image='post_images/cursor.jpg', caption=f"post {i}") for i in range(8)
+        ])
+        now = timezone.now()
+        posts = list(Post.objects.order_by('id'))
+        for i, post in enumerate(posts):
+            post.create_time = now if i < 5 else now - timedelta(minutes=i)
+        Post.objects.bulk_update(posts, ['create_time'])
+        cls.expected = list(Post.objects.order_by('-create_time', '-id').values_list('id', flat=True))
+
+    def get_page(self, url):
+        # Links carry the cursor and page_size in their query string.
+        request = Request(APIRequestFactory().get(url))
+        paginator = CustomPagination()
+        page = paginator.paginate_queryset(Post.objects.all(), request)
+        return [post.pk for post in page], paginator.get_paginated_response([]).data
+
+    def test_round_trip_splits_equal_create_time(self):
+        pages, url = [], '/posts/list/?page_size=3'
+        while url:
+            ids, data = self.get_page(url)
+            pages.append(ids)
+            url = data['next']
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 2])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        # And back again from the last page through the previous links.
+        url, back = data['previous'], [pages.pop()]
+        while url:
+            ids, data = self.get_page(url)
+            back.append(ids)
+            url = data['previous']
+        self.assertEqual(back[::-1], [pages[0], pages[1], back[0]])
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'eyJ2IjpbXX0='):
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.get_page(f'/posts/list/?cursor={cursor}')
+
+
+class PaginationCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='count-author', password='!')
+        Post.objects.bulk_create([
+            Post(author=cls.author, image='post_images/count.jpg', caption=f"post {i}") for i in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_size(self, url, queryset=None):
+        paginator = CustomPagination()
+        paginator.paginate_queryset(Post.objects.all() if queryset is None else queryset,
+                                    Request(APIRequestFactory().get(url)))
+        data = paginator.get_paginated_response([]).data
+        return data['size'], data['size_exact']
+
+    def test_size_only_on_request(self):
+        self.assertEqual(self.get_size('/posts/list/'), (None, None))
+        self.assertEqual(self.get_size('/posts/list/?count=false'), (None, None))
+
+    def test_small_table_is_counted_exactly(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Post._meta.db_table}")
+        self.assertEqual(EstimatedCount.estimate(Post.objects.all()), 3)
+        self.assertEqual(self.get_size('/posts/list/?count=true'), (3, True))
+
+    def test_large_table_is_estimated(self):
+        with mock.patch.object(EstimatedCount, 'estimate', return_value=50000):
+            self.assertEqual(self.get_size('/posts/list/?count=1'), (50000, False))
+            # Filtered querysets are always counted, since the estimate is per table.
+            filtered = Post.objects.filter(author=self.author)
+            self.assertEqual(self.get_size('/posts/list/?count=true', filtered), (3, True))
+
+    def test_exact_count_is_cached(self):
+        self.assertEqual(ExactCount().count(Post.objects.all()), (3, True))
+        self.assertEqual(CachedCount().count(Post.objects.all()), (3, True))
+        Post.objects.create(author=self.author, image='post_images/count.jpg', caption='late')
+        self.assertEqual(CachedCount().count(Post.objects.all()), (3, True))
+        self.assertEqual(ExactCount().count(Post.objects.all()), (4, True))
+
+
+class MediaBlobTests(TemporaryMediaRootMixin, TestCase):
+
+    def setUp(self):
+        super(MediaBlobTests, self).setUp()
+        self.storage = ContentAddressedStorage(location=self.media_root)
+
+    def refcount(self, name):
+        return MediaBlob.objects.filter(name=name).values_list('refcount', flat=True).first()
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.storage.save('post_images/a.png', ContentFile(b'same bytes'))
+        second = self.storage.save('post_images/b.PNG', ContentFile(b'same bytes'))
+        digest = hashlib.sha256(b'same bytes').hexdigest()
+        self.assertEqual(first, f'post_images/{digest[:2]}/{digest[2:4]}/{digest}.png')
+        self.assertEqual((second, self.refcount(first)), (first, 2))
+        self.assertEqual(MediaBlob.objects.get(name=first).size, len(b'same bytes'))
+
+        self.storage.delete(first)
+        self.assertEqual(self.refcount(first), 1)
+        self.assertTrue(self.storage.exists(first))
+        self.storage.delete(first)
+        self.assertIsNone(self.refcount(first))
+        self.assertFalse(self.storage.exists(first))
+
+    def test_release_files_waits_for_commit(self):
+        name = self.storage.save('post_images/a.png', ContentFile(b'released'))
+        with mock.patch('django.core.files.storage.default_storage', self.storage):
+            with self.captureOnCommitCallbacks() as callbacks:
+                storage.release_files(name, '')
+            self.assertEqual(self.refcount(name), 1)
+            for callback in callbacks:
+                callback()
+        self.assertIsNone(self.refcount(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_file_without_row_has_one_owner(self):
+        # Stored before deduplication.
+        os.makedirs(os.path.join(self.media_root, 'post_images'))
+        with open(os.path.join(self.media_root, 'post_images', 'old.jpg'), 'wb') as file:
+            file.write(b'old bytes')
+        self.storage.delete('post_images/old.jpg')
+        self.assertFalse(self.storage.exists('post_images/old.jpg'))
+
+
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        User.objects.create(username='limited-user', password='!')
+        self.client = APIClient()
+
+    def login(self, userinput='limited-user'):
+        return self.client.post('/users/login/', {'userinput': userinput, 'password': 'xato-parol'}, format='json')
+
+    def test_login_limit_answers_429_with_retry_after(self):
+        limit, period = throttling.RATES['login']['identifier']
+        # 100 seconds into a window with nothing counted in the previous one.
+        now = (int(time.time()) // period + 1) * period + 100
+        with mock.patch.object(throttling.time, 'time', return_value=now):
+            for _ in range(limit):
+                self.assertEqual(self.login().status_code, 400)
+            response = self.login(' Limited-User ')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], str(period - 100))
+            self.assertEqual(response.data['message'], throttling.RateLimited.default_detail['message'])
+            # Another account from the same address is still let through.
+            self.assertEqual(self.login('other-user').status_code, 400)
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import math
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_CACHE = getattr(settings, 'RATE_LIMIT_CACHE', 'default')
+# Per view `throttle_scope`: a rate for each key the request is counted under.
+# "10/15m" means 10 requests per 15 minutes.
+RATE_LIMITS = {
+    'signup': {'ip': '20/h', 'identifier': '5/h'},
+    'verify': {'ip': '100/h', 'user': '10/h'},
+    'login': {'ip': '30/m', 'identifier': '10/15m'},
+    'forgot_password': {'ip': '10/h', 'identifier': '3/h'},
+}
+RATE_LIMITS.update(getattr(settings, 'RATE_LIMITS', {}))
+# Request fields naming the account being signed up, logged in or reset.
+IDENTIFIER_FIELDS = ('userinput', 'email_or_phone')
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Used while the shared cache is unreachable: limits then hold per process.
+_fallback = LocMemCache('rate-limit', {'OPTIONS': {'MAX_ENTRIES': 100000}})
+
+
+def parse_rate(rate):
+    match = re.fullmatch(r'(\d+)/(\d*)([smhd])\w*', rate)
+    if match is None:
+        raise ImproperlyConfigured(f"Invalid rate {rate!r}")
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+RATES = {scope: {kind: parse_rate(rate) for kind, rate in limits.items()} for scope, limits in RATE_LIMITS.items()}
+
+
+class RateLimited(APIException):
+    status_code = 429
+    default_detail = {
+        'success': False,
+        'message': "Juda ko'p urinish, birozdan so'ng qayta urinib ko'ring"
+    }
+
+    def __init__(self, wait):
+        super(RateLimited, self).__init__()
+        # Sent back as Retry-After by DRF's exception handler.
+        self.wait = math.ceil(wait)
+
+
+class RateLimitThrottle(BaseThrottle):
+    # Sliding window counter: hits in the current fixed window, plus those of
+    # the previous one weighted by how much of it is still inside the last
+    # `period` seconds. That is one get_many per request, and one incr per key
+    # when the request is let through. Refused requests are not counted.
+
+    def allow_request(self, request, view):
+        rates = RATES.get(getattr(view, 'throttle_scope', None))
+        self.wait_time = 0
+        if not rates:
+            return True
+        checks = []
+        now = time.time()
+        for kind, (limit, period) in rates.items():
+            value = self.get_value(kind, request)
+            if value is None:
+                continue
+            window, elapsed = divmod(now, period)
+            prefix = f"rl:{view.throttle_scope}:{kind}:{period}:{self.digest(value)}"
+            checks.append((limit, period, elapsed, f"{prefix}:{window:.0f}", f"{prefix}:{window - 1:.0f}"))
+        try:
+            return self.check(caches[RATE_LIMIT_CACHE], checks)
+        except Exception:
+            logger.warning("Rate limit cache unavailable, using the local fallback", exc_info=True)
+            return self.check(_fallback, checks)
+
+    def check(self, cache, checks):
+        counts = cache.get_many([key for check in checks for key in check[3:]])
+        for limit, period, elapsed, current, previous in checks:
+            current_count, previous_count = counts.get(current, 0), counts.get(previous, 0)
+            if current_count + previous_count * (1 - elapsed / period) + 1 > limit:
+                self.wait_time = max(self.wait_time, self.wait_for(limit, period, elapsed, current_count, previous_count))
+        if self.wait_time:
+            return False
+        for limit, period, elapsed, current, previous in checks:
+            try:
+                cache.incr(current)
+            except ValueError:
+                if not cache.add(current, 1, 2 * period):
+                    cache.incr(current)
+        return True
+
+    @staticmethod
+    def wait_for(limit, period, elapsed, current_count, previous_count):
+        if current_count + 1 > limit or not previous_count:
+            return period - elapsed
+        # The moment previous_count * weight + current_count + 1 drops to limit.
+        return max(period * (1 - (limit - 1 - current_count) / previous_count) - elapsed, 1)
+
+    def get_value(self, kind, request):
+        if kind == 'ip':
+            return self.get_ident(request)
+        if kind == 'user':
+            return request.user.pk if request.user.is_authenticated else None
+        if kind == 'identifier':
+            data = request.data if hasattr(request.data, 'get') else {}
+            for field in IDENTIFIER_FIELDS:
+                value = data.get(field)
+                if isinstance(value, str) and value.strip():
+                    return ''.join(value.split()).lower()
+            return None
+        raise ImproperlyConfigured(f"Unknown rate limit key {kind!r}")
+
+    @staticmethod
+    def digest(value):
+        # Fixed-length, cache-safe keys whatever the client sent.
+        return hashlib.blake2b(str(value).encode(), digest_size=12).hexdigest()
+
+    def wait(self):
+        return self.wait_time
+
+
+class RateLimitMixin:
+    throttle_classes = [RateLimitThrottle]
+
+    def throttled(self, request, wait):
+        raise RateLimited(wait)
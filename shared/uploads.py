@@ -0,0 +1,69 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+
+UPLOAD_DIR = getattr(settings, 'UPLOAD_SESSION_DIR', None) or os.path.join(
+    settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir(), 'upload_sessions')
+UPLOAD_MAX_SIZE = getattr(settings, 'UPLOAD_SESSION_MAX_SIZE', 50 * 1024 * 1024)
+UPLOAD_MAX_CHUNK = getattr(settings, 'UPLOAD_SESSION_MAX_CHUNK', 8 * 1024 * 1024)
+UPLOAD_TTL = timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 60 * 60))
+READ_SIZE = 64 * 1024
+
+
+class OffsetMismatch(Exception):
+
+    def __init__(self, offset):
+        super(OffsetMismatch, self).__init__(offset)
+        self.offset = offset
+
+
+class SessionFile(File):
+    # Exposes the assembled part file the way Django exposes large uploads, so
+    # FileSystemStorage moves it into MEDIA_ROOT instead of copying it.
+
+    def __init__(self, path, name):
+        super(SessionFile, self).__init__(open(path, 'rb'), name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def create_part(path):
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    open(path, 'xb').close()
+
+
+def write_chunk(path, offset, stream, length):
+    # The part file is the source of truth for the offset. flock serialises
+    # concurrent PUTs of the same session without holding a DB transaction
+    # open for the duration of a slow upload.
+    with open(path, 'r+b') as part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        current = part.seek(0, os.SEEK_END)
+        if offset != current:
+            raise OffsetMismatch(current)
+        while length > 0:
+            try:
+                data = stream.read(min(READ_SIZE, length))
+            except OSError:
+                # Client went away mid-chunk: keep what arrived, it resumes from there.
+                break
+            if not data:
+                break
+            part.write(data)
+            length -= len(data)
+        return part.tell()
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for chunk in iter(lambda: part.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
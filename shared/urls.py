@@ -0,0 +1,8 @@
+from django.urls import path
+
+from shared.views import UploadSessionCreateView, UploadSessionView
+
+urlpatterns = [
+    path('', UploadSessionCreateView.as_view()),
+    path('<uuid:pk>/', UploadSessionView.as_view()),
+]
@@ -1,10 +1,10 @@
 import re
-import threading
 
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from rest_framework.exceptions import ValidationError
 
+from shared.outbox import enqueue_email
+
 email_regex = re.compile("[^@ \t\r\n]+@[^@ \t\r\n]+\.[^@ \t\r\n]+")
 phone_regex = re.compile("^[\+]?[(]?[0-9]{2}[)]?[-\s\.]?[0-9]{3}[-\s\.]?[0-9]{2,5}[-\s\.]?[0-9]{2,5}$")
 username_regex = re.compile(r"^[a-z0-9_-]{4,15}$")
@@ -40,27 +40,18 @@ def check_auth_type(user_input):
     return data
 
 
-class EmailThread(threading.Thread):
-
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
-
-    def run(self) -> None:
-        self.email.send()
-
-
 class Email:
     @staticmethod
     def send_email(data):
-        email = EmailMessage(
+        # Written to the outbox in the caller's transaction; shared.outbox
+        # delivers it after commit and retries until it goes out.
+        enqueue_email(
+            to_email=data['to_email'],
             subject=data['subject'],
             body=data['body'],
-            to=[data['to_email']]
+            content_type=data.get('content_type', 'plain'),
+            dedupe_key=data.get('dedupe_key'),
         )
-        if data.get('content_type') == 'html':
-            email.content_subtype = 'html'
-        EmailThread(email).start()
 
 
 def send_email(email, code):
@@ -73,6 +64,7 @@ def send_email(email, code):
             'subject': "Ro'yxatdan o'tish",
             'body': html_content,
             'to_email': email,
-            'content_type': 'html'
+            'content_type': 'html',
+            'dedupe_key': f"verify:{email}:{code}",
         }
     )
@@ -1,3 +1,88 @@
-from django.shortcuts import render
+import uuid
 
-# Create your views here.
+from django.shortcuts import get_object_or_404
+from django.utils.module_loading import import_string
+from rest_framework import generics, status
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from shared.media import MEDIA_PERMISSION_CLASSES, MEDIA_REQUIRE_AUTH, serve_media
+from shared.models import UploadSession
+from shared.serializers import UploadSessionSerializer
+from shared.uploads import UPLOAD_MAX_CHUNK, OffsetMismatch, create_part, write_chunk
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated, ]
+
+    def perform_create(self, serializer):
+        session = serializer.save(id=uuid.uuid4(), user=self.request.user)
+        create_part(session.path)
+
+
+class UploadSessionView(APIView):
+    # GET reports how many bytes the server holds; PUT appends the raw request
+    # body at the `Upload-Offset` header, which must equal that number.
+    permission_classes = [IsAuthenticated, ]
+
+    def get_object(self):
+        return get_object_or_404(UploadSession.objects.active(), pk=self.kwargs['pk'], user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        session = self.get_object()
+        return Response({
+            'success': True,
+            'offset': session.offset,
+            'size': session.size,
+        })
+
+    def put(self, request, *args, **kwargs):
+        session = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({
+                'success': False,
+                'message': "Upload-Offset sarlavhasi kerak"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if length > UPLOAD_MAX_CHUNK or offset + length > session.size:
+            return Response({
+                'success': False,
+                'message': "Bo'lak hajmi juda katta"
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            offset = write_chunk(session.path, offset, request.stream, length) if length else session.offset
+        except OffsetMismatch as error:
+            return Response({
+                'success': False,
+                'message': "Offset mos emas",
+                'offset': error.offset,
+            }, status=status.HTTP_409_CONFLICT)
+        except FileNotFoundError:
+            return Response({
+                'success': False,
+                'message': "Yuklash sessiyasi topilmadi"
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'success': True,
+            'offset': offset,
+            'size': session.size,
+        })
+
+
+class MediaView(APIView):
+    # Access is decided here, per file through MEDIA_PERMISSION_CLASSES; the
+    # bytes go through the front proxy when MEDIA_ACCEL is set, otherwise
+    # through serve_media's Range/ETag path.
+
+    def get_permissions(self):
+        permissions = [IsAuthenticated()] if MEDIA_REQUIRE_AUTH else [AllowAny()]
+        return permissions + [import_string(path)() for path in MEDIA_PERMISSION_CLASSES]
+
+    def get(self, request, *args, **kwargs):
+        name = self.kwargs['name']
+        self.check_object_permissions(request, name)
+        return serve_media(request, name, private=MEDIA_REQUIRE_AUTH or bool(MEDIA_PERMISSION_CLASSES))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, UserConfirmation
+from .models import User, UserConfirmation, Follow
 
 # Register your models here.
 
@@ -10,3 +10,4 @@ class UserAdmin(admin.ModelAdmin):
 
 admin.site.register(User, UserAdmin)
 admin.site.register(UserConfirmation)
+admin.site.register(Follow)
@@ -0,0 +1,60 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from users.models import User, TRUSTED_CLAIMS
+
+USER_ACTIVE_TTL = getattr(settings, 'USER_ACTIVE_TTL', 30)
+
+
+def active_cache_key(user_id):
+    return f"user-active:{user_id}"
+
+
+def is_active_user(user_id):
+    # Only this flag is cached, in the shared cache. users.signals drops it
+    # when the user is saved or deleted; queryset.update() shows up after
+    # USER_ACTIVE_TTL seconds. A deleted user is cached as inactive.
+    key = active_cache_key(user_id)
+    active = cache.get(key)
+    if active is None:
+        active = bool(User.objects.filter(pk=user_id).values_list('is_active', flat=True).first())
+        cache.set(key, active, USER_ACTIVE_TTL)
+    return active
+
+
+def invalidate_user(user_id):
+    cache.delete(active_cache_key(user_id))
+
+
+def token_user(user_id, claims):
+    # A real User instance, so it works in ORM filters, FK assignments and
+    # comparisons, with only id, is_active and the claims loaded. The first
+    # access to any other field reads the row (User.refresh_from_db), and
+    # save() does not write back claim values it did not change.
+    loaded = {'id': user_id, 'is_active': True, **claims}
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in loaded]
+    user = User.from_db(DEFAULT_DB_ALIAS, names, [loaded[name] for name in names])
+    user.token_values = loaded
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    # request.user from the signed claims; the only lookup is the cached
+    # is_active flag. Tokens issued before the claims were added go through
+    # the usual lookup.
+
+    def get_user(self, validated_token):
+        try:
+            user_id = uuid.UUID(str(validated_token[api_settings.USER_ID_CLAIM]))
+            claims = {name: validated_token[name] for name in TRUSTED_CLAIMS}
+        except (KeyError, ValueError):
+            return super(ClaimsJWTAuthentication, self).get_user(validated_token)
+        if not is_active_user(user_id):
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        return token_user(user_id, claims)
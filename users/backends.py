@@ -0,0 +1,27 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User
+
+
+class LoginBackend(ModelBackend):
+    # Email, phone number or username: the user row is found with one indexed
+    # query and the password is checked against it, without a second lookup.
+    # Django's own forms (the admin login) pass `username=`, which is matched
+    # exactly, as ModelBackend does.
+    def authenticate(self, request, userinput=None, password=None, **kwargs):
+        username = kwargs.get(User.USERNAME_FIELD)
+        if password is None:
+            return None
+        if userinput is not None:
+            users = User.objects.by_login(userinput)
+        elif username is not None:
+            users = User.objects.filter(**{User.USERNAME_FIELD: username})
+        else:
+            return None
+        user = next(iter(users[:1]), None)
+        if user is None:
+            # Hash anyway, so a missing user costs as much as a wrong password.
+            User().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
@@ -0,0 +1,112 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+
+WORKERS = getattr(settings, 'PASSWORD_HASH_WORKERS', 2)
+# Hashes waiting or running at once. The request thread still waits for its
+# hash, but for at most TIMEOUT seconds in all (for a slot and for the result)
+# and then gets a 503, instead of a login burst taking every core or holding
+# request threads indefinitely.
+QUEUE_SIZE = getattr(settings, 'PASSWORD_HASH_QUEUE', 32)
+TIMEOUT = getattr(settings, 'PASSWORD_HASH_TIMEOUT', 10)
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(QUEUE_SIZE)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    # Same algorithm and prefix as Django's, with the cost taken from
+    # PASSWORD_HASH_ITERATIONS. must_update() compares iterations, so hashes
+    # made with another cost are redone on the next successful login.
+    def __init__(self):
+        self.iterations = getattr(settings, 'PASSWORD_HASH_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
+
+
+class HasherBusy(APIException):
+    status_code = 503
+    default_detail = {
+        'success': False,
+        'message': "Server band, birozdan so'ng qayta urinib ko'ring"
+    }
+
+
+def encode(hasher, password, salt):
+    # Runs in a worker process; the hasher is pickled with its settings.
+    return hasher.encode(password, salt)
+
+
+def verify(hasher, password, encoded):
+    return hasher.verify(password, encoded)
+
+
+def harden_runtime(hasher, password, encoded):
+    hasher.harden_runtime(password, encoded)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a process that holds DB connections and threads is unsafe.
+            _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def run(function, *args):
+    deadline = time.monotonic() + TIMEOUT
+    if not _slots.acquire(timeout=TIMEOUT):
+        raise HasherBusy()
+    try:
+        future = get_executor().submit(function, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda done: _slots.release())
+    try:
+        return future.result(timeout=max(deadline - time.monotonic(), 0))
+    except TimeoutError:
+        # Dropped if no worker has picked it up yet; a running hash finishes
+        # and frees its slot then.
+        future.cancel()
+        raise HasherBusy()
+
+
+def is_hashed(encoded):
+    # Any hash one of PASSWORD_HASHERS can read, not only the default one.
+    try:
+        hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return True
+
+
+def make_password(password):
+    if password is None:
+        return hashers.make_password(None)
+    hasher = hashers.get_hasher('default')
+    return run(encode, hasher, password, hasher.salt())
+
+
+def check_password(password, encoded, setter=None):
+    # django.contrib.auth.hashers.check_password, with the hashing done in the pool.
+    if password is None or not hashers.is_password_usable(encoded):
+        return False
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = run(verify, hasher, password, encoded)
+    if not is_correct and not hasher_changed and must_update:
+        run(harden_runtime, hasher, password, encoded)
+    if setter and is_correct and must_update:
+        setter(password)
+    return is_correct
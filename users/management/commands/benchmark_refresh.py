@@ -0,0 +1,91 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from users.models import User
+from users.serializers import RefreshTokenSerializer
+from users.tokens import RefreshToken, blacklist_filter
+
+
+class Command(BaseCommand):
+    help = "Measure refresh-token throughput against a large blacklist, database check vs Bloom filter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--blacklisted', type=int, default=1000000)
+        parser.add_argument('--refreshes', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+        started = time.perf_counter()
+        self.fill_blacklist(prefix, options['blacklisted'])
+        self.stdout.write(f"{options['blacklisted']} ta token qora ro'yxatga qo'shildi: "
+                          f"{time.perf_counter() - started:.1f}s")
+        user = User.objects.create(id=uuid.uuid4(), username=f"bench-{uuid.uuid4().hex[:10]}", password='!')
+        try:
+            tokens = [str(RefreshToken.for_user(user)) for _ in range(20)]
+            started = time.perf_counter()
+            blacklist_filter.__init__()
+            blacklist_filter.start().join()
+            bloom = blacklist_filter.bloom
+            self.stdout.write(f"Bloom filtr: {time.perf_counter() - started:.1f}s, {len(bloom.bits) / 2 ** 20:.1f} MiB, "
+                              f"{bloom.hashes} hash, {bloom.count} JTI")
+            refreshes = options['refreshes']
+            for mode, token_class in (('database', BaseRefreshToken), ('bloom', RefreshToken)):
+                self.measure(f"{mode} check", refreshes, lambda i: token_class(tokens[i % len(tokens)]))
+                RefreshTokenSerializer.token_class = token_class
+                self.measure(f"{mode} refresh", refreshes,
+                             lambda i: RefreshTokenSerializer(data={'refresh': tokens[i % len(tokens)]}).is_valid(
+                                 raise_exception=True))
+            RefreshTokenSerializer.token_class = RefreshToken
+            misses = sum(f"{prefix}probe-{i}" in bloom for i in range(100000))
+            self.stdout.write(f"false positive: {misses / 1000:.3f}% (100000 ta tekshiruv)")
+        finally:
+            User.objects.filter(pk=user.pk).delete()
+            self.clear_blacklist(prefix)
+            blacklist_filter.__init__()
+
+    def measure(self, label, count, call):
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            for i in range(count):
+                call(i)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label}: {count / elapsed:.0f}/s, {len(queries) / count:.2f} so'rov/token")
+
+    @staticmethod
+    def fill_blacklist(prefix, count):
+        outstanding = OutstandingToken._meta.db_table
+        blacklisted = BlacklistedToken._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {outstanding} (jti, token, created_at, expires_at) "
+                f"SELECT %s || md5(i::text), '', now(), now() + interval '1 day' FROM generate_series(1, %s) i",
+                [prefix, count],
+            )
+            cursor.execute(
+                f"INSERT INTO {blacklisted} (token_id, blacklisted_at) "
+                f"SELECT id, now() - interval '1 day' FROM {outstanding} WHERE jti LIKE %s",
+                [prefix + '%'],
+            )
+            cursor.execute(f"ANALYZE {outstanding}, {blacklisted}")
+
+    @staticmethod
+    def clear_blacklist(prefix):
+        outstanding = OutstandingToken._meta.db_table
+        blacklisted = BlacklistedToken._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {blacklisted} WHERE token_id IN (SELECT id FROM {outstanding} WHERE jti LIKE %s)",
+                [prefix + '%'],
+            )
+            cursor.execute(f"DELETE FROM {outstanding} WHERE jti LIKE %s", [prefix + '%'])
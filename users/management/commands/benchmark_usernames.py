@@ -0,0 +1,72 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from users import hashers, usernames
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Measure default username generation against millions of existing generated usernames"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3000000)
+        parser.add_argument('--signups', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        marker = f"bench-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        filled = self.fill_users(marker, options['users'])
+        self.stdout.write(f"{filled} ta foydalanuvchi qo'shildi: {time.perf_counter() - started:.1f}s")
+        try:
+            self.measure_generation(options['signups'])
+            self.measure_signups(marker, options['signups'])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {User._meta.db_table} WHERE first_name = %s", [marker])
+
+    def measure_generation(self, count):
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            names = [User.free_username() for _ in range(count)]
+            elapsed = time.perf_counter() - started
+        longest = max(len(name) for name in names)
+        self.stdout.write(f"free_username: {elapsed / count * 1000:.2f} ms, {len(queries) / count:.3f} so'rov/nom, "
+                          f"eng uzun nom {longest} belgi")
+
+    def measure_signups(self, marker, count):
+        # Hashed once up front, so only the username and the insert are timed.
+        password = hashers.make_password(uuid.uuid4().hex)
+        started = time.perf_counter()
+        for _ in range(count):
+            User(id=uuid.uuid4(), first_name=marker, password=password).save()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"User.save (nom bilan): {count / elapsed:.0f}/s")
+
+    @staticmethod
+    def fill_users(marker, count):
+        # Random suffixes from the same alphabet and length as usernames.candidates.
+        alphabet = usernames.ALPHABET
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {User._meta.db_table} (id, password, is_superuser, username, first_name, last_name, "
+                f"is_staff, is_active, date_joined, create_time, update_time, user_role, auth_type, auth_status, "
+                f"high_fanout) "
+                f"SELECT gen_random_uuid(), '!', false, %s || (SELECT string_agg(substr(%s, "
+                f"(random() * %s)::int + 1, 1), '') FROM generate_series(1, %s + 0 * i)), %s, '', false, true, "
+                f"now(), now(), now(), 'simple', 'email', 'done', false FROM generate_series(1, %s) i "
+                f"ON CONFLICT (username) DO NOTHING",
+                [usernames.USERNAME_PREFIX, alphabet, len(alphabet) - 1, usernames.USERNAME_SUFFIX_LENGTH, marker,
+                 count],
+            )
+            filled = cursor.rowcount
+            cursor.execute(f"ANALYZE {User._meta.db_table}")
+        return filled
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_alter_user_id_alter_userconfirmation_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='userconfirmation',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False),
+        ),
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.UUIDField(default=uuid.UUID('e39ff7c7-dda5-458c-963d-88f6bf1b166e'), primary_key=True, serialize=False)),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL)),
+                ('following', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('follower', 'following'), name='FollowUnique'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 16:43
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_alter_user_id_alter_userconfirmation_id_follow_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='high_fanout',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='userconfirmation',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('468cb985-8067-4e35-a7eb-ff295c319b2b'), primary_key=True, serialize=False),
+        ),
+    ]
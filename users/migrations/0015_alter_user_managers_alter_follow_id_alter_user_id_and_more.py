@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:08
+
+from django.db import migrations, models
+import django.db.models.functions.text
+import users.models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_user_high_fanout_alter_follow_id_alter_user_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.LoginUserManager()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('c0494a3f-b249-42ed-a8b6-4fe0af99f8ed'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('c0494a3f-b249-42ed-a8b6-4fe0af99f8ed'), primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='userconfirmation',
+            name='id',
+            field=models.UUIDField(default=uuid.UUID('c0494a3f-b249-42ed-a8b6-4fe0af99f8ed'), primary_key=True, serialize=False),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='users_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='users_username_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(models.Func(models.F('phone_number'), models.Value('[^0-9]'), models.Value(''), models.Value('g'), function='regexp_replace', output_field=models.CharField()), name='users_phone_digits_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:46
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_alter_user_managers_alter_follow_id_alter_user_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='follow',
+            name='id',
+            field=models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='userconfirmation',
+            name='id',
+            field=models.UUIDField(default=uuid.uuid4, primary_key=True, serialize=False),
+        ),
+    ]
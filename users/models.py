@@ -1,17 +1,54 @@
 import datetime
 import random
+import re
 import uuid
 
-from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.db import models, transaction, IntegrityError
+from django.db.models.functions import Lower
+from rest_framework.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.validators import FileExtensionValidator
 
 from shared.models import BaseModel
+from users import hashers, usernames
+from shared.utility import check_auth_type
 
 SIMPLE, MANAGER, ADMIN = 'simple', 'manager', 'admin'
 VIA_EMAIL, VIA_PHONE = 'email', 'phone'
 NEW, CODE_VERIFIED, DONE, PHOTO_STEP = 'new', 'code_verified', 'done', 'photo_step'
+# Copied into JWTs for clients. Only TRUSTED_CLAIMS are loaded into
+# request.user by users.authentication: the others can change during the
+# token's lifetime and gate what the user may do, so they are read from the row.
+TOKEN_CLAIMS = ('username', 'user_role', 'auth_status')
+TRUSTED_CLAIMS = ('username',)
+
+
+def normalized_phone(field='phone_number'):
+    # Digits only, so "+998 90 123-45-67" and "+998901234567" share one index key.
+    return models.Func(models.F(field), models.Value('[^0-9]'), models.Value(''), models.Value('g'),
+                       function='regexp_replace', output_field=models.CharField())
+
+
+class LoginQuerySet(models.QuerySet):
+    def by_login(self, user_input):
+        # Filters on exactly the expressions indexed in User.Meta, so an email,
+        # phone number or username resolves with one index lookup. Usernames
+        # made outside signup (createsuperuser, the admin) need not match the
+        # signup pattern and are looked up as usernames.
+        try:
+            auth_type = check_auth_type(user_input)
+        except ValidationError:
+            auth_type = 'username'
+        if auth_type == 'email':
+            return self.alias(login_key=Lower('email')).filter(login_key=user_input.lower())
+        if auth_type == 'phone':
+            return self.alias(login_key=normalized_phone()).filter(login_key=re.sub(r'[^0-9]', '', user_input))
+        return self.alias(login_key=Lower('username')).filter(login_key=user_input.lower())
+
+
+class LoginUserManager(UserManager.from_queryset(LoginQuerySet)):
+    pass
 
 
 class User(AbstractUser, BaseModel):
@@ -43,6 +80,18 @@ class User(AbstractUser, BaseModel):
     user_role = models.CharField(max_length=13, choices=USER_RULES, default=SIMPLE)
     auth_type = models.CharField(max_length=13, choices=AUTH_TYPE)
     auth_status = models.CharField(max_length=13, choices=AUTH_STATUS, default=NEW)
+    # Set once an account passes FEED_FANOUT_THRESHOLD followers: its posts are
+    # then pulled into feeds at read time instead of pushed to every follower.
+    high_fanout = models.BooleanField(default=False)
+
+    objects = LoginUserManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(Lower('email'), name='users_email_lower_idx'),
+            models.Index(Lower('username'), name='users_username_lower_idx'),
+            models.Index(normalized_phone(), name='users_phone_digits_idx'),
+        ]
 
     def __str__(self):
         return self.username
@@ -53,10 +102,20 @@ class User(AbstractUser, BaseModel):
 
     def default_username(self):
         if not self.username:
-            norm_username = f"instagram-{str(uuid.uuid4()).split('-')[-1]}"
-            while User.objects.filter(username=norm_username):
-                norm_username += str(range(1, 9))
-            self.username = norm_username
+            self.username = User.free_username()
+
+    @staticmethod
+    def free_username():
+        # One query per batch of random handles; if every one is taken the
+        # suffix gets a character longer instead of retrying the same space.
+        length = usernames.USERNAME_SUFFIX_LENGTH
+        while True:
+            candidates = usernames.candidates(usernames.USERNAME_BATCH, length)
+            taken = set(User.objects.filter(username__in=candidates).values_list('username', flat=True))
+            for candidate in candidates:
+                if candidate not in taken:
+                    return candidate
+            length += 1
 
     def check_email(self):
         if self.email:
@@ -69,9 +128,21 @@ class User(AbstractUser, BaseModel):
             self.password = norm_password
 
     def hash_password(self):
-        if not self.password.startswith('pbkdf2_sha256'):
+        if not hashers.is_hashed(self.password):
             self.set_password(self.password)
 
+    def set_password(self, raw_password):
+        self.password = hashers.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return hashers.check_password(raw_password, self.password, setter)
+
     def clean(self):
         self.default_username()
         self.default_password()
@@ -79,8 +150,56 @@ class User(AbstractUser, BaseModel):
         self.hash_password()
 
     def save(self, *args, **kwargs):
+        generated = not self.username
         self.clean()
-        super(User, self).save(*args, **kwargs)
+        if getattr(self, 'token_values', None) is not None and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = self.token_update_fields()
+        if not generated:
+            super(User, self).save(*args, **kwargs)
+            return
+        # Another signup can take the generated name between the check and the
+        # insert; the unique constraint catches it and a new name is drawn.
+        for attempt in range(usernames.USERNAME_RETRIES):
+            try:
+                with transaction.atomic():
+                    super(User, self).save(*args, **kwargs)
+                return
+            except IntegrityError as error:
+                if attempt == usernames.USERNAME_RETRIES - 1 or not User.is_username_conflict(error):
+                    raise
+                self.username = User.free_username()
+
+    @staticmethod
+    def is_username_conflict(error):
+        # The constraint PostgreSQL named for `username = ...(unique=True)`.
+        diag = getattr(error.__cause__, 'diag', None)
+        return getattr(diag, 'constraint_name', None) == f"{User._meta.db_table}_username_key"
+
+    def refresh_from_db(self, using=None, fields=None):
+        # A user built from token claims has only a few fields loaded; the
+        # first access to any other one loads all of them from the database in
+        # one query instead of one query per attribute.
+        deferred = self.get_deferred_fields()
+        if fields is not None and getattr(self, 'token_values', None) is not None and set(fields) <= deferred:
+            fields = deferred
+        super(User, self).refresh_from_db(using, fields)
+
+    def token_update_fields(self):
+        # Values copied from the token may be older than the row, so only the
+        # ones changed since are written, plus the fields read from the database.
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred and (
+                field.attname not in self.token_values
+                or getattr(self, field.attname) != self.token_values[field.attname]
+            )
+        ]
+
+    def add_claims(self, token):
+        for name in TOKEN_CLAIMS:
+            token[name] = getattr(self, name)
+        return token
 
     def create_verify_code(self, verify_type):
         code = ''.join([str(random.randint(1, 10) % 10) for _ in range(4)])
@@ -101,12 +220,29 @@ class User(AbstractUser, BaseModel):
 
     def token(self):
         token = RefreshToken.for_user(self)
+        self.add_claims(token)
         return {
             'access': str(token.access_token),
             'refresh': str(token)
         }
 
 
+class Follow(BaseModel):
+    follower = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='following')
+    following = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='followers')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['follower', 'following'],
+                name='FollowUnique'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.follower} -> {self.following}"
+
+
 class UserConfirmation(BaseModel):
     VERIFY_TYPE = (
         (VIA_EMAIL, VIA_EMAIL),
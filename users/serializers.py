@@ -4,6 +4,7 @@ from django.contrib.auth import authenticate
 from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import FileExtensionValidator
+from django.db import transaction
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from rest_framework import serializers
@@ -11,8 +12,10 @@ from rest_framework.exceptions import ValidationError, NotFound
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from rest_framework_simplejwt.tokens import AccessToken
 
+from shared.storage import release_files
 from shared.utility import check_email_or_phone, send_email, check_auth_type
 from .models import User, VIA_EMAIL, VIA_PHONE, CODE_VERIFIED, DONE, PHOTO_STEP
+from .tokens import RefreshToken
 
 
 class SignUpSerializers(serializers.ModelSerializer):
@@ -28,14 +31,15 @@ class SignUpSerializers(serializers.ModelSerializer):
         model = User
         fields = ['id', 'auth_type', 'auth_status']
 
+    @transaction.atomic
     def create(self, validated_data):
         user = super(SignUpSerializers, self).create(validated_data)
         if user.auth_type == VIA_EMAIL:
             code = user.create_verify_code(VIA_EMAIL)
-            send_email(user, code)
+            send_email(user.email, code)
         elif user.auth_type == VIA_PHONE:
             code = user.create_verify_code(VIA_PHONE)
-            send_email(user, code)
+            send_email(user.phone_number, code)
             # send_phone(user, code)
         else:
             data = {
@@ -133,6 +137,7 @@ class UserInfoUpdateSerializer(serializers.Serializer):
         return username
 
     def update(self, instance, validated_data):
+        instance.refresh_from_db(fields=['auth_status'])
         instance.first_name = validated_data.get('first_name', instance.first_name)
         instance.last_name = validated_data.get('last_name', instance.last_name)
         instance.username = validated_data.get('username', instance.username)
@@ -158,10 +163,13 @@ class UserPhotoChangeSerializer(serializers.Serializer):
                                    validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'heic', 'heif'])])
 
     def update(self, instance, validated_data):
+        instance.refresh_from_db(fields=['auth_status'])
+        replaced = instance.photo.name
         instance.photo = validated_data.get('photo', None)
         if instance.auth_status in (DONE, PHOTO_STEP):
             instance.auth_status = PHOTO_STEP
         instance.save()
+        release_files(replaced)
         return instance
 
 
@@ -187,47 +195,23 @@ class LoginSerializer(TokenObtainPairSerializer):
     @staticmethod
     def check_auth(data):
         user_input = data.get('userinput')
-        auth_type = check_auth_type(user_input)
-        if auth_type == 'email':
-            username = LoginSerializer.get_user(email__iexact=user_input).username
-        elif auth_type == 'phone':
-            username = LoginSerializer.get_user(phone_number__iexact=user_input).username
-        elif auth_type == 'username':
-            username = LoginSerializer.get_user(username__iexact=user_input).username
-        else:
-            error = {
-                'success': False,
-                'message': "Email, telefon yoki foydalanuvchi nomi xato"
-            }
-            raise ValidationError(error)
-
-        authenticate_kwargs = {
-            'username': username,
-            'password': data.get('password')
-        }
-        user = authenticate(**authenticate_kwargs)
+        check_auth_type(user_input)
+        user = authenticate(userinput=user_input, password=data.get('password'))
         if user:
             return user
-        else:
+        if not User.objects.by_login(user_input).exists():
             raise ValidationError({
-                'success': False,
-                'message': "Parolingiz xat!o"
-            })
-
-    @staticmethod
-    def get_user(**kwargs):
-        users = User.objects.filter(**kwargs)
-        if users:
-            return users.first()
-        else:
-            data = {
                 'success': False,
                 'message': "Bunday foydalanuvchi mavjud emas!"
-            }
-            raise ValidationError(data)
+            })
+        raise ValidationError({
+            'success': False,
+            'message': "Parolingiz xat!o"
+        })
 
 
 class RefreshTokenSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -235,6 +219,8 @@ class RefreshTokenSerializer(TokenRefreshSerializer):
         user_id = access_token_instance['user_id']
         user = get_object_or_404(User, id=user_id)
         update_last_login(None, user)
+        # Claims copied from the refresh token may be days old.
+        data['access'] = str(user.add_claims(access_token_instance))
         return data
 
 
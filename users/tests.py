@@ -1,3 +1,161 @@
-from django.test import TestCase
+import threading
+from concurrent.futures import Future
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+from users import hashers, tokens, usernames
+from users.models import User, UserConfirmation, NEW, CODE_VERIFIED, DONE, VIA_EMAIL
+
+# Already a hash, so save() does not send it through the hashing pool.
+HASHED_PASSWORD = 'pbkdf2_sha256$1$salt$hash'
+
+
+class GeneratedUsernameTests(TestCase):
+    # Another signup taking the generated name between free_username()'s
+    # check and the insert is simulated by handing out a taken name.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.taken = User.objects.create(username='instagram-taken', email='taken@example.com',
+                                        password=HASHED_PASSWORD)
+
+    def test_collision_draws_a_new_username(self):
+        with mock.patch.object(User, 'free_username', side_effect=['instagram-taken', 'instagram-fresh']) as free:
+            user = User(password=HASHED_PASSWORD)
+            user.save()
+        self.assertEqual(free.call_count, 2)
+        user.refresh_from_db()
+        self.assertEqual(user.username, 'instagram-fresh')
+        self.assertEqual(User.objects.filter(username='instagram-taken').count(), 1)
+
+    def test_gives_up_after_retries(self):
+        with mock.patch.object(User, 'free_username', return_value='instagram-taken') as free:
+            with self.assertRaises(IntegrityError):
+                User(password=HASHED_PASSWORD).save()
+        self.assertEqual(free.call_count, usernames.USERNAME_RETRIES)
+
+    def test_other_conflicts_are_not_retried(self):
+        with mock.patch.object(User, 'free_username', return_value='instagram-other') as free:
+            with self.assertRaises(IntegrityError):
+                User(email='taken@example.com', password=HASHED_PASSWORD).save()
+        self.assertEqual(free.call_count, 1)
+        self.assertFalse(User.objects.filter(username='instagram-other').exists())
+
+    def test_chosen_username_is_not_replaced(self):
+        with self.assertRaises(IntegrityError):
+            User(username='instagram-taken', password=HASHED_PASSWORD).save()
+
+
+class AdminLoginTests(TestCase):
+    # createsuperuser names need not match the signup username pattern.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('Site.Admin', 'admin@example.com', 'Kuchli-parol-2024')
+
+    def test_authenticate_by_username(self):
+        self.assertEqual(authenticate(username='Site.Admin', password='Kuchli-parol-2024'), self.admin)
+        self.assertIsNone(authenticate(username='Site.Admin', password='xato-parol'))
+        self.assertEqual(authenticate(userinput='site.admin', password='Kuchli-parol-2024'), self.admin)
+
+    def test_admin_login(self):
+        response = self.client.post('/admin/login/?next=/admin/',
+                                    {'username': 'Site.Admin', 'password': 'Kuchli-parol-2024'})
+        self.assertRedirects(response, '/admin/')
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+
+
+class StaleTokenClaimsTests(TestCase):
+    # An access token keeps the auth_status it was issued with for its whole
+    # lifetime; gates and transitions must go by the row.
+
+    def setUp(self):
+        self.user = User.objects.create(username='claims-user', email='claims@example.com',
+                                        password=HASHED_PASSWORD, auth_status=NEW)
+        self.client = APIClient()
+        # Issued before verification, so its auth_status claim says "new".
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.user.token()['access'])
+        UserConfirmation.objects.create(user=self.user, code='1234', verify_type=VIA_EMAIL)
+
+    def test_update_after_verify_with_pre_verify_token(self):
+        self.assertEqual(self.client.post('/users/verify/', {'code': '1234'}).status_code, 200)
+        response = self.client.put('/users/user-update/', {
+            'first_name': 'Ali', 'last_name': 'Valiyev', 'username': 'claims-user2',
+            'password': 'Kuchli-parol-2024', 'password_confirm': 'Kuchli-parol-2024',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.auth_status, self.user.username), (DONE, 'claims-user2'))
+
+    def test_verify_does_not_downgrade_done_user(self):
+        User.objects.filter(pk=self.user.pk).update(auth_status=DONE)
+        self.assertEqual(self.client.post('/users/verify/', {'code': '1234'}).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.auth_status, DONE)
+
+
+class TokenBlacklistFilterTests(TransactionTestCase):
+    # The build runs on its own thread and connection, so rows are committed.
+
+    def setUp(self):
+        patcher = mock.patch.object(tokens, 'blacklist_filter', tokens.TokenBlacklistFilter())
+        self.filter = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(username='blacklist-user', password=HASHED_PASSWORD)
+
+    def test_built_lazily_with_database_fallback(self):
+        # Blacklisted through simplejwt directly, as another process would.
+        refresh = BaseRefreshToken.for_user(self.user)
+        refresh.blacklist()
+        self.assertIsNone(self.filter.builder)
+        with self.assertRaises(TokenError):
+            tokens.RefreshToken(str(refresh))
+        # The check above started the build; wait for it (or a new one if done).
+        self.filter.start().join()
+        self.assertIn(refresh['jti'], self.filter.bloom)
+        with self.assertRaises(TokenError):
+            tokens.RefreshToken(str(refresh))
+        self.assertFalse(self.filter.might_contain('not-blacklisted'))
+
+
+class StalledExecutor:
+    # Every hash stays queued, as when all workers are taken.
+
+    def submit(self, function, *args):
+        return Future()
+
+
+class HasherTimeoutTests(TestCase):
+
+    def setUp(self):
+        # A single slot, so whether it was given back shows in acquire().
+        self.slots = threading.BoundedSemaphore(1)
+        for patcher in (mock.patch.object(hashers, 'get_executor', StalledExecutor),
+                        mock.patch.object(hashers, 'TIMEOUT', 0.05),
+                        mock.patch.object(hashers, '_slots', self.slots)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_wait_is_capped_and_slot_released(self):
+        with self.assertRaises(hashers.HasherBusy):
+            hashers.make_password('parol')
+        self.assertTrue(self.slots.acquire(blocking=False))
+        self.slots.release()
+
+    def test_full_queue_answers_busy(self):
+        self.slots.acquire()
+        self.addCleanup(self.slots.release)
+        with self.assertRaises(hashers.HasherBusy):
+            hashers.make_password('parol')
+
+    def test_login_answers_503(self):
+        User.objects.create(username='hasher-busy', password=HASHED_PASSWORD)
+        response = APIClient().post('/users/login/', {'userinput': 'hasher-busy', 'password': 'parol'}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['message'], hashers.HasherBusy.default_detail['message'])
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+
+ERROR_RATE = getattr(settings, 'REFRESH_BLACKLIST_ERROR_RATE', 0.001)
+SYNC_INTERVAL = getattr(settings, 'REFRESH_BLACKLIST_SYNC_INTERVAL', 1)
+# Each sync re-reads the rows this close to the last one seen (by time and by
+# id), so blacklistings whose transaction committed late are not skipped.
+SYNC_OVERLAP = timedelta(seconds=60)
+SYNC_OVERLAP_ROWS = 1000
+MIN_CAPACITY = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        # Double hashing: k positions from the two halves of one digest.
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class TokenBlacklistFilter:
+    # Per-process Bloom filter of blacklisted refresh-token JTIs. It is built
+    # on a background thread started by the first check (or at startup by the
+    # WSGI/ASGI entry point with REFRESH_BLACKLIST_PRELOAD), and rebuilt twice
+    # as large the same way once it passes its capacity; until the first build
+    # finishes every check goes to the database. Tokens
+    # blacklisted by this process are added immediately; those blacklisted
+    # elsewhere are picked up by an incremental sync at most every
+    # SYNC_INTERVAL seconds. A miss is definite, so only probable hits (true
+    # ones plus ERROR_RATE of the rest) reach the database.
+
+    def __init__(self, error_rate=ERROR_RATE, sync_interval=SYNC_INTERVAL):
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.builder = None
+        self.added = []
+        self.synced_at = None
+        self.last_id = 0
+        self.next_sync = 0
+
+    def might_contain(self, jti):
+        bloom = self.bloom
+        if bloom is None or bloom.count > bloom.capacity:
+            self.start()
+            if bloom is None:
+                return True
+        # Only one request syncs at a time; the others use the filter as is.
+        if time.monotonic() >= self.next_sync and self.lock.acquire(blocking=False):
+            try:
+                self.sync()
+            finally:
+                self.lock.release()
+        return jti in self.bloom
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+            if self.builder is not None:
+                self.added.append(jti)
+
+    def start(self):
+        with self.lock:
+            if self.builder is None:
+                self.builder = threading.Thread(target=self.build, name='token-blacklist-filter', daemon=True)
+                self.builder.start()
+            return self.builder
+
+    def build(self):
+        try:
+            started = timezone.now()
+            bloom = BloomFilter(max(BlacklistedToken.objects.count() * 2, MIN_CAPACITY), self.error_rate)
+            last_id = 0
+            for pk, jti in BlacklistedToken.objects.values_list('pk', 'token__jti').iterator(chunk_size=10000):
+                bloom.add(jti)
+                last_id = max(last_id, pk)
+            with self.lock:
+                # Blacklisted by this process while the rows were being read.
+                for jti in self.added:
+                    bloom.add(jti)
+                self.bloom, self.synced_at, self.last_id = bloom, started, last_id
+                self.next_sync = time.monotonic() + self.sync_interval
+        except Exception as error:
+            # E.g. the tables do not exist yet; the next check tries again.
+            logger.warning("Refresh token blacklist filter could not be built: %s", error)
+        finally:
+            with self.lock:
+                self.builder = None
+                self.added = []
+            connection.close()
+
+    def sync(self):
+        started = timezone.now()
+        recent = BlacklistedToken.objects.filter(pk__gt=self.last_id - SYNC_OVERLAP_ROWS,
+                                                 blacklisted_at__gte=self.synced_at - SYNC_OVERLAP)
+        for pk, jti in recent.values_list('pk', 'token__jti'):
+            self.bloom.add(jti)
+            self.last_id = max(self.last_id, pk)
+        self.synced_at = started
+        self.next_sync = time.monotonic() + self.sync_interval
+
+
+blacklist_filter = TokenBlacklistFilter()
+
+
+class RefreshToken(BaseRefreshToken):
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super(RefreshToken, self).check_blacklist()
+
+    def blacklist(self):
+        result = super(RefreshToken, self).blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return result
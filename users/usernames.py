@@ -0,0 +1,16 @@
+import secrets
+import string
+
+from django.conf import settings
+
+USERNAME_PREFIX = getattr(settings, 'USERNAME_PREFIX', 'instagram-')
+# 36 ** 5 = 60M suffixes: with a few million users a candidate is free over
+# 90% of the time, and a whole batch is taken in well under 1 in 10 ** 8 signups.
+USERNAME_SUFFIX_LENGTH = getattr(settings, 'USERNAME_SUFFIX_LENGTH', 5)
+USERNAME_BATCH = getattr(settings, 'USERNAME_BATCH', 8)
+USERNAME_RETRIES = getattr(settings, 'USERNAME_RETRIES', 3)
+ALPHABET = string.digits + string.ascii_lowercase
+
+
+def candidates(count, length):
+    return [USERNAME_PREFIX + ''.join(secrets.choice(ALPHABET) for _ in range(length)) for _ in range(count)]
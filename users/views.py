@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from django.utils.datetime_safe import datetime
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import CreateAPIView, UpdateAPIView
@@ -5,24 +7,31 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.exceptions import TokenError
-from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from post.feed import backfill_timeline, drop_from_timeline
+from shared.models import UploadSession, USER_PHOTO
+from shared.throttling import RateLimitMixin
 from shared.utility import send_email, check_email_or_phone
-from .models import User, NEW, CODE_VERIFIED, VIA_EMAIL, VIA_PHONE, DONE
+from .models import User, Follow, NEW, CODE_VERIFIED, VIA_EMAIL, VIA_PHONE, DONE
 from .serializers import SignUpSerializers, UserInfoUpdateSerializer, UserPhotoChangeSerializer, LoginSerializer, \
     RefreshTokenSerializer, LogOutSerializer, ForgotPasswordSerializer, ResetPasswordSerializer
+from .tokens import RefreshToken
 
 
-class SignUpView(CreateAPIView):
+class SignUpView(RateLimitMixin, CreateAPIView):
     queryset = User.objects.all()
     permission_classes = [AllowAny, ]
+    throttle_scope = 'signup'
     serializer_class = SignUpSerializers
 
 
-class VerifyAPIView(APIView):
+class VerifyAPIView(RateLimitMixin, APIView):
     permission_classes = [IsAuthenticated, ]
+    throttle_scope = 'verify'
 
+    @transaction.atomic
     def get(self, *args, **kwargs):
         user = self.request.user
         self.check_user(user)
@@ -79,6 +88,8 @@ class VerifyAPIView(APIView):
             }
             raise ValidationError(data)
         verify.update(is_confirmation=True)
+        # The row's status, not the one the access token was issued with.
+        user.refresh_from_db(fields=['auth_status'])
         if user.auth_status == NEW:
             user.auth_status = CODE_VERIFIED
             user.save()
@@ -136,8 +147,37 @@ class UserPhotoUpdateView(UpdateAPIView):
         return Response(data)
 
 
-class LoginView(TokenObtainPairView):
+class UserPhotoUploadFinalizeView(UserPhotoUpdateView):
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        session = get_object_or_404(UploadSession.objects.active(), pk=self.kwargs['pk'],
+                                    user=self.request.user, target=USER_PHOTO)
+        photo = session.assemble()
+        if photo is None:
+            return Response({
+                'success': False,
+                'message': "Fayl to'liq yuklanmagan yoki checksum mos emas",
+                'offset': session.offset,
+            }, status=400)
+        user = self.get_object()
+        with photo:
+            serializer = self.get_serializer(user, data={'photo': photo})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        session.discard()
+        data = {
+            'success': True,
+            'message': "Rasmingiz o'zgartirildi!",
+            'auth_status': user.auth_status
+        }
+        data.update(user.token())
+        return Response(data)
+
+
+class LoginView(RateLimitMixin, TokenObtainPairView):
     permission_classes = (AllowAny,)
+    throttle_scope = 'login'
     serializer_class = LoginSerializer
 
 
@@ -165,13 +205,15 @@ class LogOutView(APIView):
             return Response(status=400)
 
 
-class ForgotPasswordView(APIView):
+class ForgotPasswordView(RateLimitMixin, APIView):
     permission_classes = [AllowAny, ]
+    throttle_scope = 'forgot_password'
     serializer_class = ForgotPasswordSerializer
 
     def get_object(self):
         return self.request.user
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=self.request.data)
         serializer.is_valid(raise_exception=True)
@@ -215,3 +257,32 @@ class ResetPasswordView(UpdateAPIView):
         data.update(user.token())
         data['auth_status'] = user.auth_status
         return Response(data=data, status=200)
+
+
+class FollowApiView(APIView):
+    permission_classes = [IsAuthenticated, ]
+
+    def post(self, request, *args, **kwargs):
+        following = get_object_or_404(User, pk=self.kwargs['pk'])
+        user = self.request.user
+        if following.pk == user.pk:
+            raise ValidationError({
+                'success': False,
+                'message': "O'zingizga obuna bo'lolmaysiz!"
+            })
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=user, following=following).delete()
+            if deleted:
+                drop_from_timeline(user.pk, following.pk)
+                return Response({
+                    'success': True,
+                    'message': "Obuna bekor qilindi!",
+                    'following': False,
+                }, status=200)
+            Follow.objects.create(follower=user, following=following)
+            backfill_timeline(user.pk, following.pk)
+        return Response({
+            'success': True,
+            'message': "Obuna bo'lindi!",
+            'following': True,
+        }, status=201)